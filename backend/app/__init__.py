@@ -1,8 +1,12 @@
 from flask import Flask
 from .extensions import db, migrate
+from . import notifications
 from .clubs.routes import bp as clubs_bp
 from .questions.routes import bp as questions_bp
 from .recommend.routes import bp as recommend_bp
+from .routes import bp as api_bp
+from .metrics.routes import bp as metrics_bp
+from .metrics import registry as metrics
 from flask_cors import CORS
 from .cli import register_commands
 import os
@@ -13,15 +17,25 @@ def create_app():
     CORS(app)  # フロントエンドからのCORS対応
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # 推薦セッションのトークン署名に使用（全サーバープロセスで同じ値を設定する。未設定の場合/recommend/sessionは503を返す）
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    if not app.config['SECRET_KEY']:
+        app.logger.warning('SECRET_KEY is not set; /recommend/session is disabled')
 
     # extensionsの初期化
     db.init_app(app)
     migrate.init_app(app, db)
+    # 特徴量更新などの変更通知（サーバープロセスでのホットリロード）
+    notifications.init_app(app)
+    # リクエスト毎のレイテンシ・SQL発行数などの計測
+    metrics.init_app(app)
 
     # BluePrintの登録
     app.register_blueprint(clubs_bp, url_prefix='/clubs')
     app.register_blueprint(questions_bp, url_prefix='/questions')
     app.register_blueprint(recommend_bp, url_prefix='/recommend')
+    app.register_blueprint(api_bp)
+    app.register_blueprint(metrics_bp)
 
     # CLIコマンドの登録
     register_commands(app)
@@ -1,4 +1,35 @@
 import click
+import functools
+from datetime import datetime
+
+
+def refreshes_serving_state(f):
+    """ 推薦スコアの入力（クラブ・スタジアム・質問・重み）を変更するコマンドに付与し、
+        実行後に特徴量の世代番号を進め、メモリ上の推薦用データと推薦結果キャッシュを無効化する
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        result = f(*args, **kwargs)
+        # --dry-runではDBを変更しないため無効化しない
+        if not kwargs.get('dry_run'):
+            from .recommend.serving import invalidate_serving_state
+            invalidate_serving_state()
+        return result
+    return wrapper
+
+
+def publishes_change(topic):
+    """ 実行後に指定topicの変更を全サーバープロセスに通知するコマンドに付与する
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            result = f(*args, **kwargs)
+            from .notifications import publish_change
+            publish_change(topic)
+            return result
+        return wrapper
+    return decorator
 
 
 def register_commands(app):
@@ -6,14 +37,19 @@ def register_commands(app):
     # seedデータ投入・更新コマンド
     # --------------------------------------------------------
     @app.cli.command('seed-clubs')
-    def seed_clubs():
+    @click.option('--season', type=int, default=2025, help='投入するseed_clubs_<season>.jsonのシーズン')
+    @click.option('--dry-run', is_flag=True, help='DBを変更せずに差分のみ表示する')
+    @refreshes_serving_state
+    def seed_clubs(season, dry_run):
         """ J1〜J3全クラブをDBに投入
         """
         from .seeds.load import run_seed_clubs
         with app.app_context():
-            run_seed_clubs()
+            run_seed_clubs(season=season, dry_run=dry_run)
 
     @app.cli.command('seed-questions')
+    @refreshes_serving_state
+    @publishes_change('questions')
     def seed_questions():
         """ 質問と選択肢をDBに投入
         """
@@ -22,14 +58,17 @@ def register_commands(app):
             run_seed_questions()
 
     @app.cli.command('seed-weights')
-    def seed_weights():
+    @click.option('--dry-run', is_flag=True, help='DBを変更せずに差分のみ表示する')
+    @refreshes_serving_state
+    def seed_weights(dry_run):
         """ 質問・選択肢の組と特徴量の重みのマッピング情報をDBに投入
         """
         from .seeds.load import run_seed_weights
         with app.app_context():
-            run_seed_weights()
+            run_seed_weights(dry_run=dry_run)
 
     @app.cli.command('seed-prefectures')
+    @refreshes_serving_state
     def seed_prefectures():
         """ 都道府県データをDBに投入
         """
@@ -38,20 +77,34 @@ def register_commands(app):
             run_seed_prefectures()
 
     @app.cli.command('seed-stadiums')
-    def seed_stadiums():
+    @click.option('--season', type=int, default=2025, help='投入するseed_stadiums_<season>.jsonのシーズン')
+    @click.option('--dry-run', is_flag=True, help='DBを変更せずに差分のみ表示する')
+    @refreshes_serving_state
+    def seed_stadiums(season, dry_run):
         """ スタジアムデータをDBに投入
         """
         from .seeds.load import run_seed_stadiums
         with app.app_context():
-            run_seed_stadiums()
+            run_seed_stadiums(season=season, dry_run=dry_run)
+
+    @app.cli.command('seed-club-aliases')
+    @click.option('--dry-run', is_flag=True, help='DBを変更せずに差分のみ表示する')
+    def seed_club_aliases(dry_run):
+        """ クラブの別表記（旧名称・表記ゆれ・外部サイトの識別子）をDBに投入
+        """
+        from .seeds.load import run_seed_club_aliases
+        with app.app_context():
+            run_seed_club_aliases(dry_run=dry_run)
 
     @app.cli.command('migrate-stadiums')
+    @refreshes_serving_state
     def migrate_stadiums():
         from .seeds.load import migrate_stadiums
         with app.app_context():
             migrate_stadiums()
 
     @app.cli.command('update-club-features')
+    @refreshes_serving_state
     def update_club_features():
         from .seeds.load import update_club_features
         with app.app_context():
@@ -61,11 +114,18 @@ def register_commands(app):
     # 特徴量集計用コマンド
     # --------------------------------------------------------
     @app.cli.command('collect-popularity')
-    @click.argument('division')
-    def exec_collect_popularity_score(division):
+    @click.argument('division', default='all')
+    @click.option('--restart', is_flag=True, help='チェックポイントを破棄して最初から取得する')
+    @click.option('--retry-failed', is_flag=True, help='取得に失敗したクラブを再取得する')
+    @click.option('--fake', is_flag=True, help='オフライン用のダミークライアントで実行する')
+    def exec_collect_popularity_score(division, restart, retry_failed, fake):
         from .scripts.features.popularity_score.collect_popularity_score import collect_popularity_score
         with app.app_context():
-            collect_popularity_score(division=division)
+            try:
+                collect_popularity_score(division=division, restart=restart,
+                                         retry_failed=retry_failed, fake=fake)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint='DIVISION')
 
     @app.cli.command('collect-attendance')
     @click.argument('year')
@@ -105,18 +165,21 @@ def register_commands(app):
     # 特徴量DB登録用コマンド
     # --------------------------------------------------------
     @app.cli.command('update-popularity')
+    @refreshes_serving_state
     def exec_update_popularity_score():
         from .scripts.features.popularity_score.update_popularity_score import update_popularity_score
         with app.app_context():
             update_popularity_score()
 
     @app.cli.command('update-attendance')
+    @refreshes_serving_state
     def exec_update_home_attendance():
         from .scripts.features.home_attendance.update_home_attendance import update_home_attendance
         with app.app_context():
             update_home_attendance()
 
     @app.cli.command('update-availability')
+    @refreshes_serving_state
     def exec_update_ticket_availability():
         from .scripts.features.ticket_availability.update_ticket_availability import update_ticket_availability
         with app.app_context():
@@ -124,31 +187,78 @@ def register_commands(app):
 
     @app.cli.command('update-strength')
     @click.argument('term')
+    @refreshes_serving_state
     def exec_update_strength(term):
         from .scripts.features.strength.update_strength import update_strength
         with app.app_context():
             update_strength(term=term)
 
     @app.cli.command('update-play-style')
+    @refreshes_serving_state
     def exec_update_play_style():
         from .scripts.features.play_style.update_play_style import update_play_style
         with app.app_context():
             update_play_style()
 
     @app.cli.command('update-youth')
+    @refreshes_serving_state
     def exec_update_youth_promotion_score():
         from .scripts.features.youth_promotion_score.update_youth_promotion_score import update_youth_promotion_score
         with app.app_context():
             update_youth_promotion_score()
 
     @app.cli.command('update-titles')
+    @refreshes_serving_state
     def exec_update_titles():
         from .scripts.features.titles.update_titles import update_titles
         with app.app_context():
             update_titles()
 
     @app.cli.command('update-financial-power')
+    @refreshes_serving_state
     def exec_update_financial_power():
         from .scripts.features.financial_power.update_financial_power import update_financial_power
         with app.app_context():
             update_financial_power()
+
+    # --------------------------------------------------------
+    # 特徴量パイプライン
+    # --------------------------------------------------------
+    @app.cli.group('features')
+    def features():
+        """ 特徴量の収集・更新パイプライン
+        """
+
+    @features.command('run')
+    @click.option('--year', type=int, default=lambda: datetime.now().year,
+                  help='集計対象シーズンの西暦（既定は今年）')
+    @click.option('--only', multiple=True, help='実行するステージ（複数指定可、既定は全ステージ）')
+    @click.option('--no-collect', is_flag=True, help='Webからの収集ステージを実行しない')
+    @click.option('--force', is_flag=True, help='入力が変わっていないupdateステージも実行する')
+    @click.option('--dry-run', is_flag=True, help='実行せずに実行予定のステージを表示する')
+    @click.option('--workers', type=int, default=4, help='並行実行するステージ数')
+    def features_run(year, only, no_collect, force, dry_run, workers):
+        """ 収集→更新のステージを依存関係に従って実行し、最後に1回だけ推薦用特徴量の世代番号を進める
+        """
+        from .scripts.features.pipeline import run_pipeline
+        with app.app_context():
+            try:
+                results = run_pipeline(year, only=list(only), no_collect=no_collect,
+                                       force=force, dry_run=dry_run, workers=workers)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint='--only')
+        for name, status in results.items():
+            print(f'{name}: {status}')
+        failed = [name for name, status in results.items()
+                  if status in ('failed', 'blocked')]
+        if failed:
+            raise click.ClickException(f'failed stages: {", ".join(failed)}')
+
+    @features.command('list')
+    def features_list():
+        """ パイプラインのステージと依存関係を表示する
+        """
+        from .scripts.features.pipeline import STAGES
+        for stage in STAGES:
+            deps = f' <- {", ".join(stage.deps)}' if stage.deps else ''
+            print(f'{stage.name}{deps}')
@@ -0,0 +1,112 @@
+import os
+import re
+import unicodedata
+from sqlalchemy import select
+from ..models import Club, ClubAlias
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # rapidfuzzが無い環境では完全一致のみ
+    fuzz = process = None
+
+# 表記ゆれとみなす類似度の下限（rapidfuzzのratio, 0〜100）
+FUZZY_THRESHOLD = float(os.getenv('CLUB_FUZZY_THRESHOLD', 85))
+# 照合時に無視する記号・空白（NFKC正規化後）
+_IGNORED = re.compile(r'[\s\.\-・･_]')
+
+
+def normalize_key(value) -> str:
+    """ クラブ名を照合用のキーに正規化する
+        全角英数字を半角に揃え（NFKC）、大文字小文字・空白・区切り記号の違いを無視する
+        例: 'ＦＣ東京' -> 'fc東京', '京都サンガF.C.' -> '京都サンガfc', '横浜Ｆ・マリノス' -> '横浜fマリノス'
+    """
+    if value is None:
+        return ''
+    return _IGNORED.sub('', unicodedata.normalize('NFKC', str(value))).casefold()
+
+
+class ClubResolver:
+    """ クラブ名・略称・別表記をclubs.idに解決する
+        keys: 正規化キー→クラブIDの辞書（複数クラブに該当するキーはambiguousに入れ解決しない）
+        fuzzy_matches: あいまい一致で解決した(入力, 一致したキー, スコア)の記録
+    """
+
+    def __init__(self, pairs):
+        self.keys = {}
+        self.ambiguous = set()
+        for key, club_id in pairs:
+            key = normalize_key(key)
+            if not key or key in self.ambiguous:
+                continue
+            if key in self.keys and self.keys[key] != club_id:
+                del self.keys[key]
+                self.ambiguous.add(key)
+                continue
+            self.keys[key] = club_id
+        self._choices = list(self.keys)
+        self.fuzzy_matches = []
+
+    @classmethod
+    def load(cls, conn):
+        """ clubsの正式名・略称とclub_aliasesの別表記を読み込む（2クエリ）
+            conn: SQLAlchemyのConnection（create_engineのもの、db.session.connection()どちらでも可）
+        """
+        pairs = []
+        for club_id, name, short_name in conn.execute(
+                select(Club.id, Club.name, Club.short_name)):
+            pairs.append((name, club_id))
+            pairs.append((short_name, club_id))
+        pairs.extend((normalized, club_id) for club_id, normalized in conn.execute(
+            select(ClubAlias.club_id, ClubAlias.normalized)))
+        return cls(pairs)
+
+    def resolve(self, *candidates, fuzzy=True):
+        """ 候補の表記を順に試してクラブIDを返す（解決できなければNone）
+            全候補の完全一致を先に試し、どれも一致しない場合のみあいまい一致を試す
+            fuzzy=Falseの場合は完全一致（正規化キー・別表記）のみ
+        """
+        keys = [normalize_key(c) for c in candidates if c is not None and c == c]
+        for key in keys:
+            if key in self.keys:
+                return self.keys[key]
+        if not fuzzy:
+            return None
+        for key in keys:
+            club_id = self._fuzzy(key)
+            if club_id is not None:
+                return club_id
+        return None
+
+    def resolve_all(self, *columns, fuzzy=True):
+        """ 複数の列（同じ長さのイテラブル）を行毎にresolveしたクラブIDのリストを返す
+        """
+        return [self.resolve(*values, fuzzy=fuzzy) for values in zip(*columns)]
+
+    def suggest(self, candidate):
+        """ あいまい一致で最も近いキーを(入力の正規化キー, 一致したキー, スコア)で返す（無ければNone）
+            解決には使わず、別表記の登録候補として表示するためのもの
+        """
+        key = normalize_key(candidate)
+        match = self._closest(key)
+        if match is None:
+            return None
+        matched_key, score = match
+        return key, matched_key, round(score, 1)
+
+    def _fuzzy(self, key):
+        match = self._closest(key)
+        if match is None:
+            return None
+        matched_key, score = match
+        self.fuzzy_matches.append((key, matched_key, round(score, 1)))
+        return self.keys[matched_key]
+
+    def _closest(self, key):
+        if process is None or not key or not self._choices:
+            return None
+        match = process.extractOne(
+            key, self._choices, scorer=fuzz.ratio, score_cutoff=FUZZY_THRESHOLD)
+        if match is None:
+            return None
+        matched_key, score, _ = match
+        return matched_key, score
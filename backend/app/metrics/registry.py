@@ -0,0 +1,194 @@
+import bisect
+import threading
+import time
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# レイテンシ（秒）のヒストグラムのバケット
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# レスポンスサイズ（バイト）のヒストグラムのバケット
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+# 1リクエストあたりのSQL発行数のヒストグラムのバケット
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Counter:
+    """ ラベル毎に加算する単調増加のカウンタ
+    """
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}',
+                 f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(
+                    f'{self.name}{format_labels(self.label_names, key)} {format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """ ラベル毎の累積バケット・合計・件数を持つヒストグラム
+    """
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}',
+                 f'# TYPE {self.name} histogram']
+        bucket_names = self.label_names + ('le',)
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else format_value(bound)
+                    lines.append(
+                        f'{self.name}_bucket{format_labels(bucket_names, key + (le,))} {cumulative}')
+                labels = format_labels(self.label_names, key)
+                lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """ メトリクスとcollector（描画時に値を取得する関数）をまとめてPrometheus形式で出力する
+        collectorは(name, type, help, [(labels_dict, value), ...])のリストを返す
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(
+                        f'{name}{format_labels(tuple(labels), tuple(labels.values()))} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name,
+                     value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method'))
+requests_total = registry.counter(
+    'http_requests_total', 'Requests by endpoint and status.', ('endpoint', 'method', 'status'))
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Response payload size by endpoint.', ('endpoint',), SIZE_BUCKETS)
+sql_statements = registry.histogram(
+    'db_statements_per_request', 'SQL statements issued per request.', ('endpoint',), COUNT_BUCKETS)
+sql_duration = registry.counter(
+    'db_statement_duration_seconds_total', 'Time spent in SQL statements.', ('endpoint',))
+sql_total = registry.counter(
+    'db_statements_total', 'SQL statements issued.', ('endpoint',))
+
+
+def init_app(app):
+    """ リクエスト毎のレイテンシ・ステータス・レスポンスサイズ・SQL発行数を記録する
+    """
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_count = 0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        request_duration.observe(time.perf_counter() - started,
+                                 endpoint=endpoint, method=request.method)
+        requests_total.inc(endpoint=endpoint, method=request.method,
+                           status=str(response.status_code))
+        if not response.direct_passthrough and response.content_length is not None:
+            response_size.observe(response.content_length, endpoint=endpoint)
+        sql_statements.observe(g.pop('metrics_sql_count', 0), endpoint=endpoint)
+        return response
+
+    # 全Engine（Flask-SQLAlchemyと特徴量スクリプトのcreate_engine）のSQLを計測する
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    endpoint = 'none'
+    if has_request_context():
+        endpoint = request.endpoint or 'unknown'
+        g.metrics_sql_count = g.get('metrics_sql_count', 0) + 1
+    sql_total.inc(endpoint=endpoint)
+    sql_duration.inc(elapsed, endpoint=endpoint)
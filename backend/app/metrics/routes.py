@@ -0,0 +1,66 @@
+from flask import Blueprint, Response
+from .registry import registry
+from ..recommend.cache import result_cache
+from ..recommend.serving import peek_serving_state
+from ..questions.payload import peek_questions_payload
+
+bp = Blueprint('metrics', __name__)
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    ''' Prometheus形式でメトリクスを返すエンドポイント（値はワーカープロセス毎）
+    '''
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@registry.register_collector
+def collect_result_cache():
+    stats = result_cache.stats()
+    return [
+        ('recommend_cache_lookups_total', 'counter', 'Recommend result cache lookups.', [
+            ({'result': 'hit'}, stats['hits']),
+            ({'result': 'miss'}, stats['misses']),
+        ]),
+        ('recommend_cache_evictions_total', 'counter', 'Recommend result cache entries dropped.', [
+            ({'reason': 'lru'}, stats['evictions']),
+            ({'reason': 'ttl'}, stats['expirations']),
+        ]),
+        ('recommend_cache_entries', 'gauge', 'Recommend result cache size.', [
+            ({}, stats['size']),
+        ]),
+        ('recommend_cache_hit_ratio', 'gauge', 'Recommend result cache hit ratio.', [
+            ({}, stats['hit_ratio']),
+        ]),
+    ]
+
+
+@registry.register_collector
+def collect_serving_state():
+    state = peek_serving_state()
+    questions = peek_questions_payload()
+    samples = [
+        ('serving_state_warm', 'gauge', 'Whether the recommend serving state is loaded.', [
+            ({}, int(state is not None)),
+        ]),
+        ('questions_payload_warm', 'gauge', 'Whether the questions payload is loaded.', [
+            ({}, int(questions is not None)),
+        ]),
+    ]
+    if state is not None:
+        samples += [
+            ('serving_generation', 'gauge', 'Feature generation of the serving state.', [
+                ({}, state.generation),
+            ]),
+            ('serving_clubs', 'gauge', 'Clubs in the serving state.', [
+                ({}, state.feature_store.n_clubs),
+            ]),
+            ('serving_choices', 'gauge', 'Weighted choices in the serving state.', [
+                ({}, len(state.weight_index.keys)),
+            ]),
+        ]
+    if questions is not None:
+        samples.append(('questions_payload_bytes', 'gauge', 'Questions payload size by encoding.', [
+            ({'encoding': 'identity'}, len(questions.body)),
+        ] + [({'encoding': encoding}, len(body)) for encoding, body in questions.encoded.items()]))
+    return samples
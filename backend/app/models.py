@@ -183,6 +183,10 @@ class QuestionChoiceWeight(db.Model):
         weight: 重み
     """
     __tablename__ = 'question_choice_weights'
+    __table_args__ = (
+        db.UniqueConstraint('question_id', 'choice_id', 'feature_name',
+                            name='uq_weights_qid_cid_feature'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     question_id = db.Column(db.Integer, db.ForeignKey(
@@ -204,3 +208,24 @@ class Prefecture(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
 
     clubs = db.relationship('Club', backref='prefecture', lazy=True)
+
+
+class ClubAlias(db.Model):
+    """ クラブの別表記のモデル（正式名・略称以外の表記ゆれ、旧名称、外部サイトの識別子など）
+        id: 自動採番主キー
+        club_id: 紐づくクラブのID（外部キー）
+        alias: 別表記
+        normalized: 照合用に正規化した別表記（ユニーク）
+        source: 別表記の出典（former_name, spelling, football_lab, jleagueなど）
+    """
+    __tablename__ = 'club_aliases'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    club_id = db.Column(db.Integer, db.ForeignKey(
+        'clubs.id', ondelete='CASCADE'), nullable=False, index=True)
+    alias = db.Column(db.String(120), nullable=False)
+    normalized = db.Column(db.String(120), unique=True, nullable=False)
+    source = db.Column(db.String(50), nullable=True)
+
+    club = db.relationship('Club', backref=db.backref(
+        'aliases', cascade='all, delete-orphan', passive_deletes=True))
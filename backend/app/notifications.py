@@ -0,0 +1,182 @@
+import fcntl
+import logging
+import os
+import select
+import tempfile
+import threading
+import time
+from pathlib import Path
+from flask import current_app
+from sqlalchemy import text
+from .extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Postgresの LISTEN/NOTIFY で使うチャンネル名（payloadは"<topic>:<generation>"）
+CHANNEL = 'jclub_changes'
+# 世代番号ファイルのポーリング間隔（秒）、LISTEN/NOTIFYが使えない環境ではこの間隔で変更を検知する
+POLL_INTERVAL = float(os.getenv('CHANGE_POLL_INTERVAL', 2))
+# LISTEN用の接続が切れた場合に再接続を試みる間隔（秒）
+RECONNECT_INTERVAL = 30
+
+# topic→変更時に呼び出すハンドラ（引数は新しい世代番号）
+_handlers = {}
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def init_app(app):
+    """ 世代番号ファイルの置き場所を設定し、最初のリクエスト時に変更監視スレッドを起動する
+        CLIプロセスではリクエストを受けないため監視スレッドは起動しない
+    """
+    app.config.setdefault('CHANGE_MARKER_DIR', os.getenv(
+        'CHANGE_MARKER_DIR', app.instance_path))
+    app.config.setdefault(
+        'HOT_RELOAD', os.getenv('HOT_RELOAD', '1') not in ('0', 'false'))
+
+    @app.before_request
+    def start_change_listener():
+        if app.config['HOT_RELOAD'] and _listener is None:
+            _start_listener(app)
+
+
+def register_handler(topic, handler):
+    """ topicの変更を受け取った時に呼び出すハンドラを登録する（アプリコンテキスト内で呼び出される）
+    """
+    _handlers[topic] = handler
+
+
+def marker_path(topic):
+    return Path(current_app.config['CHANGE_MARKER_DIR']) / f'{topic}.generation'
+
+
+def read_generation(topic):
+    """ 世代番号ファイルからtopicの現在の世代番号を返す（未作成なら0）
+    """
+    try:
+        with open(marker_path(topic), 'r') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def publish_change(topic, generation=None):
+    """ topicの世代番号を進めて（generation指定時はその値に）、全サーバープロセスに変更を通知する
+        ファイルの世代番号はローカル実行時のフォールバックを兼ね、Postgresの場合はNOTIFYも送る
+    """
+    path = marker_path(topic)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 複数コマンドの同時実行で世代番号が巻き戻らないようロックする
+    with open(path.with_suffix('.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        current = read_generation(topic)
+        generation = max(current + 1, generation or 0)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=path.parent)
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(generation))
+        os.replace(tmp_path, path)
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_notify(:channel, :payload)'), {
+            'channel': CHANNEL, 'payload': f'{topic}:{generation}'})
+        db.session.commit()
+    return generation
+
+
+def _start_listener(app):
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = ChangeListener(app)
+            _listener.start()
+
+
+class ChangeListener(threading.Thread):
+    """ 変更通知を監視し、世代番号が進んだtopicのハンドラを呼び出すデーモンスレッド
+        Postgresの場合はLISTENで即時に受け取り、加えて世代番号ファイルを定期的に確認する
+    """
+
+    def __init__(self, app):
+        super().__init__(name='change-listener', daemon=True)
+        self.app = app
+        self._stop_event = threading.Event()
+        self._conn = None
+        self._next_connect = 0.0
+        with app.app_context():
+            self.known = {topic: read_generation(topic)
+                          for topic in _handlers}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    for topic, generation in self._wait_notifications():
+                        self._handle(topic, generation)
+                    for topic in _handlers:
+                        self._handle(topic, read_generation(topic))
+            except Exception:
+                logger.exception('change listener failed')
+                self._close()
+                self._stop_event.wait(POLL_INTERVAL)
+
+    def _handle(self, topic, generation):
+        if generation <= self.known.get(topic, 0) or topic not in _handlers:
+            return
+        self.known[topic] = generation
+        logger.info('%s changed (generation %d), reloading', topic, generation)
+        _handlers[topic](generation)
+
+    def _wait_notifications(self):
+        """ NOTIFYをPOLL_INTERVALまで待ち、受け取った(topic, generation)のリストを返す
+        """
+        conn = self._listen_connection()
+        if conn is None:
+            self._stop_event.wait(POLL_INTERVAL)
+            return []
+        if select.select([conn], [], [], POLL_INTERVAL) == ([], [], []):
+            return []
+        conn.poll()
+        received = []
+        while conn.notifies:
+            payload = conn.notifies.pop(0).payload
+            topic, _, generation = payload.partition(':')
+            try:
+                received.append((topic, int(generation)))
+            except ValueError:
+                continue
+        return received
+
+    def _listen_connection(self):
+        if self._conn is not None:
+            return self._conn
+        if db.engine.dialect.name != 'postgresql':
+            return None
+        now = time.monotonic()
+        if now < self._next_connect:
+            return None
+        self._next_connect = now + RECONNECT_INTERVAL
+        try:
+            # プールから切り離した専用接続でLISTENする
+            raw = db.engine.raw_connection()
+            raw.detach()
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            self._conn = conn
+        except Exception:
+            logger.warning(
+                'LISTEN failed, falling back to generation file polling', exc_info=True)
+            self._conn = None
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import json
+import threading
+from sqlalchemy.orm import selectinload
+from ..models import Question
+from ..notifications import register_handler
+
+try:
+    import brotli
+except ImportError:  # brotliが無い環境ではgzipのみ
+    brotli = None
+
+# 変更通知のtopic名（質問・選択肢の更新）
+TOPIC = 'questions'
+
+
+class QuestionsPayload:
+    """ /questionsのレスポンスをシリアライズ・圧縮済みで保持する
+        body: 非圧縮のJSONバイト列
+        etag: bodyの内容から計算したハッシュ（エンコーディング毎に接尾辞を付けて使う）
+        encoded: Content-Encoding→圧縮済みバイト列の辞書
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded = {'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(body)
+
+    @classmethod
+    def load(cls):
+        """ 質問と選択肢をまとめて読み込み（selectinloadで2クエリ）、シリアライズする
+        """
+        questions = Question.query.options(selectinload(Question.choices)) \
+            .order_by(Question.order.asc().nullslast()).all()
+        data = [
+            {
+                'id': q.id,
+                'text': q.text,
+                'order': q.order,
+                'choices': [
+                    {
+                        'id': c.id,
+                        'text': c.text,
+                        'order': c.order
+                    } for c in q.choices
+                ]
+            } for q in questions]
+        body = json.dumps({'questions': data}, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+        return cls(body)
+
+    def etag_for(self, encoding):
+        return self.etag if encoding is None else f'{self.etag}-{encoding}'
+
+    def all_etags(self):
+        return [self.etag_for(None)] + [self.etag_for(e) for e in self.encoded]
+
+    def negotiate(self, accept_encodings):
+        """ Accept-Encodingに応じて(encoding, バイト列)を返す（brotli > gzip > 非圧縮）
+        """
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encoded and accept_encodings[encoding]:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+
+_payload = None
+_lock = threading.Lock()
+
+
+def get_questions_payload():
+    """ プロセス内で共有するQuestionsPayloadを返す（初回アクセス時にDBから構築する）
+    """
+    global _payload
+    payload = _payload
+    if payload is None:
+        with _lock:
+            if _payload is None:
+                _payload = QuestionsPayload.load()
+            payload = _payload
+    return payload
+
+
+def peek_questions_payload():
+    """ 構築済みのQuestionsPayloadを返す（未構築ならNone、構築は行わない）
+    """
+    return _payload
+
+
+def invalidate_questions_payload(generation=None):
+    """ seed-questionsによる更新後に次回アクセス時の再構築を強制する
+    """
+    global _payload
+    with _lock:
+        _payload = None
+
+
+register_handler(TOPIC, invalidate_questions_payload)
@@ -1,24 +1,27 @@
-from flask import Blueprint, jsonify
-from app.models import Question, Choice
+from flask import Blueprint, Response, request
+from .payload import get_questions_payload
 
 bp = Blueprint('questions', __name__)
 
 
 @bp.route('/', methods=['GET'])
 def get_questions():
-    questions = Question.query.order_by(Question.order.asc().nullslast()).all()
-    data = [
-        {
-            'id': q.id,
-            'text': q.text,
-            'order': q.order,
-            'choices': [
-                {
-                    'id': c.id,
-                    'text': c.text,
-                    'order': c.order
-                } for c in q.choices
-            ]
-        } for q in questions]
+    ''' 質問と選択肢の一覧を返すエンドポイント
+        シリアライズ・圧縮済みのペイロードを返し、If-None-Matchが一致する場合は304を返す
+    '''
+    payload = get_questions_payload()
 
-    return jsonify({'questions': data})
+    encoding, body = payload.negotiate(request.accept_encodings)
+    # エンコーディングが異なっても内容は同じなので、いずれかのETagが一致すれば304とする
+    if any(request.if_none_match.contains_weak(etag) for etag in payload.all_etags()):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(payload.etag_for(encoding))
+    response.headers['Vary'] = 'Accept-Encoding'
+    # キャッシュは保持してよいが、利用前に毎回ETagで再検証させる
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,112 @@
+import numpy as np
+
+# 確定判定の厳密な比較で一度に扱う（上位クラブ, 上位外クラブ）の組の数の初期値と上限（一時配列の大きさの上限）
+# 未確定の場合は逆転しうる組が先頭付近で見つかることが多いため、小さいブロックから倍々に広げる
+FIRST_PAIR_BLOCK = 256
+PAIR_BLOCK = 65536
+
+
+class QuestionPlanner:
+    """ 回答途中のスコアから次に聞く質問を選び、上位k件が確定したかを判定する
+        質問毎に選択肢の寄与ベクトル（ServingState.contributionsの行）をまとめた行列を使う
+        重みの無い選択肢（「気にしない」など）を選ぶ可能性があるため、各質問の候補には寄与0の行も含める
+        スコアの正規化（平行移動と正の定数倍）は順位を変えないため、判定は正規化前のスコアで行う
+    """
+
+    def __init__(self, state):
+        self.state = state
+        rows_by_question = {}
+        for row, (question_id, _) in enumerate(state.weight_index.keys):
+            rows_by_question.setdefault(question_id, []).append(row)
+        n_clubs = state.feature_store.n_clubs
+        # question_id→(選択肢数+1)×クラブの寄与行列（最終行が寄与0）
+        self.options = {
+            question_id: np.vstack([state.contributions[rows], np.zeros((1, n_clubs))])
+            for question_id, rows in sorted(rows_by_question.items())
+        }
+        # 質問毎の各クラブの寄与の最大・最小（確定判定の枝刈りに使う上限・下限）
+        self.question_ids = list(self.options)
+        self.upper = np.array([options.max(axis=0) for options in self.options.values()]).reshape(-1, n_clubs)
+        self.lower = np.array([options.min(axis=0) for options in self.options.values()]).reshape(-1, n_clubs)
+
+    def remaining(self, answered):
+        """ 未回答で、スコアに影響する選択肢を持つ質問のIDを返す
+        """
+        return [question_id for question_id in self.options if question_id not in answered]
+
+    def is_settled(self, raw, remaining, k, division=None):
+        """ 残りの質問をどう回答しても上位k件（の顔ぶれ）が変わらない場合にTrueを返す
+            質問毎に選択肢は1つで寄与は加算なので、クラブiをクラブjが逆転しうる最大の差は
+            質問毎の「jの寄与 - iの寄与」の最大値の合計で正確に求まる
+            1. 質問毎の寄与の最大・最小の合計から、各クラブの到達しうるスコアの上限・下限を求め、
+               上限でも上位k件の下限の最小に届かない上位外のクラブ（と、どの上位外のクラブにも逆転されない上位のクラブ）を除く
+            2. 残った組のみ、逆転の可能性が高い上位外のクラブから順にブロック毎に厳密に判定し、逆転しうる組があれば打ち切る
+        """
+        top = self.state.top_k(raw, k, division)
+        selected = np.zeros(self.state.feature_store.n_clubs, dtype=bool)
+        selected[self._candidates(division)] = True
+        selected[top] = False
+        outside = np.flatnonzero(selected)
+        if len(outside) == 0 or not remaining:
+            return True
+        # 残りの質問の行を1、それ以外を0とした重みとの積で、残りの質問の寄与の最大・最小の合計を求める
+        weights = np.isin(self.question_ids, remaining).astype(np.float64)
+        # 同点の場合の順序（クラブIDの昇順）に関わらず、差を詰め切れる組があれば未確定とする
+        tolerance = 1e-9 * max(1.0, float(np.abs(raw).max()))
+        best = raw[outside] + (weights @ self.upper)[outside]
+        worst = raw[top] + (weights @ self.lower)[top]
+        threat = best >= worst.min() - tolerance
+        top = top[worst <= best.max() + tolerance]
+        outside = outside[threat][np.argsort(-best[threat], kind='stable')]
+        if len(outside) == 0:
+            return True
+        start, block = 0, max(1, FIRST_PAIR_BLOCK // len(top))
+        while start < len(outside):
+            cols = outside[start:start + block]
+            start += len(cols)
+            block = min(2 * block, max(1, PAIR_BLOCK // len(top)))
+            # gain[i, j]: 上位のクラブtop[i]に対して上位外のクラブcols[j]が詰められる最大の差
+            gain = np.zeros((len(top), len(cols)), dtype=np.float64)
+            for question_id in remaining:
+                options = self.options[question_id]
+                gain += (options[:, None, cols] - options[:, top, None]).max(axis=0)
+            margin = raw[top][:, None] - raw[cols][None, :]
+            if not (gain < margin - tolerance).all():
+                return False
+        return True
+
+    def next_question(self, raw, remaining, k, division=None):
+        """ 回答によって上位k件が最も変わる質問のIDを返す（残りが無い場合はNone）
+            1. 選択肢毎に回答した場合に、現在の上位k件から圏外に落ちるクラブ数の平均
+            2. 1が同じ場合は、上位k件を争うクラブ間での選択肢の寄与のばらつき（順位の差の付きやすさ）
+            3. それも同じ場合はquestion_idの昇順（従来の固定順に近い順）
+            全質問の全選択肢を1つの行列にまとめ、回答後のk番目のスコアを行毎の部分選択で一括計算する
+        """
+        if not remaining:
+            return None
+        candidates = self._candidates(division)
+        k = min(int(k), len(candidates))
+        if k <= 0:
+            return remaining[0]
+        top = self.state.top_k(raw, k, division)
+        # 上位k件と、その直下のk件（上位に入る可能性が高いクラブ）の間での差の付きやすさを見る
+        contenders = self.state.top_k(raw, 2 * k, division)
+        options = np.vstack([self.options[question_id] for question_id in remaining])
+        sizes = [len(self.options[question_id]) for question_id in remaining]
+        after = raw[candidates] + options[:, candidates]
+        kth = np.partition(after, len(candidates) - k, axis=1)[:, len(candidates) - k]
+        dropped = (raw[top] + options[:, top] < kth[:, None]).sum(axis=1)
+        spread = options[:, contenders].std(axis=1)
+        bounds = np.cumsum([0] + sizes)
+        best, best_key = None, None
+        for i, question_id in enumerate(remaining):
+            block = slice(bounds[i], bounds[i + 1])
+            key = (float(dropped[block].mean()), float(spread[block].mean()), -question_id)
+            if best_key is None or key > best_key:
+                best, best_key = question_id, key
+        return best
+
+    def _candidates(self, division):
+        if division is None:
+            return np.arange(self.state.feature_store.n_clubs)
+        return np.flatnonzero(self.state.feature_store.divisions == division)
@@ -0,0 +1,88 @@
+import json
+import numpy as np
+from ..extensions import db
+from ..models import Club, Stadium, Prefecture
+
+
+class ClubCards:
+    """ 推薦結果として返すクラブ情報（クラブ＋スタジアム＋都道府県）をJSONのバイト列で保持する
+        blob: 全クラブ分のJSONを連結したバイト列（uint8配列）
+        offsets: 行毎のblob上の開始位置（末尾に全体の長さを含む）
+        各行のJSONは閉じ括弧を除いた'{"id":1,...'の形で持ち、レスポンス時にscoreを繋げて閉じる
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = np.asarray(blob, dtype=np.uint8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def load(cls, club_ids):
+        """ クラブ・スタジアム・都道府県を1回の結合クエリで取得してシリアライズする
+        """
+        rows = db.session.query(
+            Club.id, Club.name, Club.division, Club.location, Club.image_url,
+            Club.team_color, Club.website_url, Club.description,
+            Stadium.name.label('stadium_name'), Stadium.latitude, Stadium.longitude,
+            Prefecture.name.label('prefecture_name'),
+        ).outerjoin(Stadium, Club.main_stadium_id == Stadium.id) \
+            .outerjoin(Prefecture, Club.prefecture_id == Prefecture.id).all()
+        by_id = {row.id: row for row in rows}
+        return cls.from_cards([card_payload(by_id.get(int(club_id)), int(club_id))
+                               for club_id in club_ids])
+
+    @classmethod
+    def from_cards(cls, cards):
+        parts = [serialize_card(card) for card in cards]
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(part) for part in parts])
+        blob = np.frombuffer(b''.join(parts), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def prefix(self, row):
+        """ 行に対応するクラブのJSON（閉じ括弧なし）を返す
+        """
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes()
+
+    def render(self, rows, scores, extras=None):
+        """ 上位クラブのJSON配列をバイト列で組み立てる
+            extras: 行毎に追加するフィールドの辞書のリスト（explainの寄与など）
+        """
+        items = []
+        for i, row in enumerate(rows):
+            item = self.prefix(row) + b',"score":' + \
+                dumps(round(float(scores[row]), 1))
+            if extras is not None:
+                for key, value in extras[i].items():
+                    item += b',' + dumps(key) + b':' + dumps(value)
+            items.append(item + b'}')
+        return b'[' + b','.join(items) + b']'
+
+
+def card_payload(row, club_id):
+    """ 結合クエリの1行をレスポンス用の辞書に変換する（クラブが見つからない場合はidのみ）
+    """
+    if row is None:
+        return {'id': club_id}
+    return {
+        'id': row.id,
+        'name': row.name,
+        'division': row.division,
+        'location': row.location,
+        'prefecture': row.prefecture_name,
+        'image_url': row.image_url,
+        'team_color': row.team_color,
+        'website_url': row.website_url,
+        'main_stadium_name': row.stadium_name,
+        'stadium_latitude': row.latitude,
+        'stadium_longitude': row.longitude,
+        'description': row.description,
+    }
+
+
+def serialize_card(card):
+    # 末尾の閉じ括弧を除いておき、レスポンス時にscoreを繋げる
+    return dumps(card)[:-1]
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -0,0 +1,106 @@
+import numpy as np
+from ..extensions import db
+from ..models import Club, Stadium
+
+# 推薦スコア計算に使うClubの特徴量カラム（行列の列順）
+CLUB_FEATURE_COLUMNS = (
+    'strength_long_term',
+    'strength_short_term',
+    'domestic_titles',
+    'international_titles',
+    'popularity_score',
+    'supporter_heat',
+    'financial_power',
+    'ticket_availability',
+    'rivalry_intensity_preference',
+    'play_style_attack',
+    'play_style_defense',
+    'youth_promotion_score',
+    'stadium_event_richness',
+    'home_attendance',
+)
+
+# メインスタジアムから参照する特徴量（特徴量名→Stadiumのカラム名）
+STADIUM_FEATURE_COLUMNS = {
+    'stadium_capacity': 'capacity',
+    'stadium_access': 'accessibility',
+}
+
+FEATURE_COLUMNS = CLUB_FEATURE_COLUMNS + tuple(STADIUM_FEATURE_COLUMNS)
+
+
+class FeatureStore:
+    """ クラブ×特徴量の行列をメモリ上に保持するストア
+        club_ids: 行に対応するクラブIDの配列
+        divisions: 行に対応するクラブの所属ディビジョンの配列
+        feature_names: 列に対応する特徴量名のタプル
+        feature_index: 特徴量名→列番号の辞書
+        matrix: クラブ×特徴量の行列（float64）
+    """
+
+    def __init__(self, club_ids, feature_names, matrix, divisions=None):
+        self.club_ids = np.asarray(club_ids, dtype=np.int64)
+        self.divisions = np.asarray(
+            divisions if divisions is not None else np.zeros(len(self.club_ids)), dtype=np.int64)
+        self.feature_names = tuple(feature_names)
+        self.feature_index = {name: i for i,
+                              name in enumerate(self.feature_names)}
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        # クラブID→行番号
+        self.row_index = {int(club_id): i for i,
+                          club_id in enumerate(self.club_ids)}
+
+    @classmethod
+    def load(cls, feature_names=FEATURE_COLUMNS):
+        """ DBからクラブの特徴量カラムのみを1クエリで取得して行列化する
+            スタジアムの特徴量はメインスタジアムを外部結合して取得する（未設定なら0）
+        """
+        columns = [feature_column(name) for name in feature_names]
+        rows = db.session.query(Club.id, Club.division, *columns) \
+            .outerjoin(Stadium, Club.main_stadium_id == Stadium.id) \
+            .order_by(Club.id).all()
+        club_ids = [row[0] for row in rows]
+        divisions = [row[1] for row in rows]
+        matrix = np.array([row[2:] for row in rows], dtype=np.float64) \
+            .reshape(len(rows), len(feature_names))
+        return cls(club_ids, feature_names, np.nan_to_num(matrix), divisions)
+
+    @property
+    def n_clubs(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_features(self):
+        return self.matrix.shape[1]
+
+    def score(self, weight_vector):
+        """ 重みベクトルから全クラブのスコア（0〜100）を一括計算する
+        """
+        return normalize_scores(self.matrix @ weight_vector)
+
+
+def feature_column(name):
+    """ 特徴量名に対応するモデルのカラムを返す
+    """
+    if name in STADIUM_FEATURE_COLUMNS:
+        return getattr(Stadium, STADIUM_FEATURE_COLUMNS[name])
+    if name in CLUB_FEATURE_COLUMNS:
+        return getattr(Club, name)
+    raise ValueError(f'unknown feature: {name}')
+
+
+def normalize_scores(scores):
+    """ スコアを0〜100に正規化する（2次元の場合は行毎に正規化する）
+        負のスコアがある場合は最小値が0になるよう平行移動し、平行移動前の最大値で割る
+        （max_scoreが0以下なら平行移動後のスコアのまま）
+    """
+    scores = np.array(scores, dtype=np.float64)
+    if scores.size == 0:
+        return scores
+    min_score = scores.min(axis=-1, keepdims=True)
+    max_score = scores.max(axis=-1, keepdims=True)
+    # 全スコアを0以上に平行移動
+    scores -= np.minimum(min_score, 0)
+    # 比率計算（max_scoreが0なら全クラブスコア0のまま）
+    positive = max_score > 0
+    return np.where(positive, scores / np.where(positive, max_score, 1) * 100, scores)
@@ -1,70 +1,202 @@
-from flask import Blueprint, request, jsonify
-from ..models import Club, QuestionChoiceWeight
+from flask import Blueprint, Response, current_app, request, jsonify
+from .cache import result_cache
+from .feature_store import normalize_scores
+from .serving import get_serving_state, get_generation
+from .session import ScoreSession, InvalidSessionToken, SessionNotConfigured, check_configured, session_cache
 
 bp = Blueprint('recommend', __name__)
 
+# 推薦結果として返すクラブ数（リクエストのkで変更可能、MAX_Kが上限）
+DEFAULT_K = 3
+MAX_K = 20
+# divisionで絞り込み可能なディビジョン
+DIVISIONS = (1, 2, 3)
+# /recommend/batchで一度に受け付ける回答セット数の上限
+MAX_BATCH_SIZE = 1000
+
 
 @bp.route('/', methods=['POST'])
 def recommend():
     ''' UIからの回答データを受け取り、推薦結果を返すエンドポイント
+        k（返却件数、省略時3）とdivision（ディビジョンの絞り込み）を任意で指定できる
     '''
     data = request.get_json()
-    answers = data.get('answers', [])
+    explain = bool(data.get('explain', False))
+    try:
+        answers = parse_answers(data.get('answers', []))
+        k, division = parse_selection(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 同じ回答セット（正規化済み）・同じ特徴量世代の結果はキャッシュから返す
+    state = get_serving_state()
+    cache_key = (state.answer_key(answers), k, division, explain)
+    body = result_cache.get(cache_key)
+    if body is not None:
+        return json_response(body)
+
+    # 選択肢毎に事前計算した寄与ベクトルを合算し、0〜100に正規化
+    scores = state.score(answers)
+
+    # 上位k件のクラブを部分選択で抽出（同点の場合はクラブIDの昇順）
+    top_rows = state.top_k(scores, k, division)
 
-    # 全クラブ取得
-    clubs = Club.query.all()
-    # 回答に対応する全重みを取得し、特徴量ごとに集約
-    feature_weights = {}
+    # シリアライズ済みのクラブ情報にスコアを繋げてレスポンスを組み立てる
+    body = b'{"results":' + state.render_results(
+        scores, top_rows, explain_answers=answers if explain else None) + b'}'
+    result_cache.put(cache_key, body)
+    return json_response(body)
+
+
+@bp.route('/batch', methods=['POST'])
+def recommend_batch():
+    ''' 複数の回答セットをまとめて受け取り、回答セット毎の推薦結果を返すエンドポイント
+        リクエスト: {"answer_sets": [[{"questionId": 1, "choiceId": 1}, ...], ...], "k": 3, "division": 1}
+    '''
+    data = request.get_json()
+    answer_sets = data.get('answer_sets', [])
+    if not isinstance(answer_sets, list):
+        return jsonify({'error': 'answer_sets must be a list'}), 400
+    if len(answer_sets) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'answer_sets must be at most {MAX_BATCH_SIZE} items'}), 400
+    try:
+        k, division = parse_selection(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    parsed = []
+    for i, answers in enumerate(answer_sets):
+        try:
+            parsed.append(parse_answers(answers))
+        except ValueError as e:
+            return jsonify({'error': f'answer_sets[{i}]: {e}'}), 400
+    answer_sets = parsed
+
+    # 全回答セットのスコアを行列積1回で算出
+    state = get_serving_state()
+    score_matrix = state.score_batch(answer_sets)
+
+    items = [b'{"results":' + state.render_results(scores, state.top_k(scores, k, division)) + b'}'
+             for scores in score_matrix]
+    return json_response(b'{"results":[' + b','.join(items) + b']}')
+
+
+@bp.route('/session', methods=['POST'])
+def recommend_session():
+    ''' 回答途中の推薦結果（ライブプレビュー）を返すエンドポイント
+        リクエスト: {"token": 前回のレスポンスのtoken（初回は省略）,
+                    "answers": [{"questionId": 1, "choiceId": 2}], "k": 3, "division": 1, "adaptive": true}
+        トークンのセッションのスコア（サーバー内に無い場合はトークン内の回答から計算）に、
+        answersの各回答（choiceIdがnullの場合は取り消し）を差分で反映して、
+        新しいtokenと現在の上位k件を返す。回答済みの質問は変更として扱う
+        adaptive=trueの場合は、次に聞くと上位k件が最も変わる質問（nextQuestionId）と、
+        残りの質問をどう回答しても上位k件が変わらないか（settled、trueなら質問を打ち切れる）も返す
+    '''
+    try:
+        check_configured()
+    except SessionNotConfigured as e:
+        current_app.logger.error(str(e))
+        return jsonify({'error': str(e)}), 503
+
+    data = request.get_json()
+    try:
+        k, division = parse_selection(data)
+        answers = parse_session_answers(data.get('answers', []))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    state = get_serving_state()
+    token = data.get('token')
+    if token:
+        try:
+            session = ScoreSession.loads(str(token))
+        except InvalidSessionToken as e:
+            # トークンが無効な場合、クライアントは全回答をtoken無しで送り直す
+            return jsonify({'error': str(e)}), 400
+        session.rebase(state)
+    else:
+        session = ScoreSession.start(state)
+    try:
+        for question_id, choice_id in answers:
+            session.apply(state, question_id, choice_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    scores = normalize_scores(session.raw)
+    top_rows = state.top_k(scores, k, division)
+    body = b'{"token":"' + session.dumps().encode('ascii') + \
+        b'","answered":' + str(len(session.answers)).encode('ascii') + \
+        b',"results":' + state.render_results(scores, top_rows)
+    if data.get('adaptive'):
+        planner = state.planner
+        remaining = planner.remaining(session.answers)
+        settled = planner.is_settled(session.raw, remaining, k, division)
+        next_question = None if settled else planner.next_question(session.raw, remaining, k, division)
+        body += b',"settled":' + (b'true' if settled else b'false') + \
+            b',"nextQuestionId":' + (b'null' if next_question is None else str(next_question).encode('ascii'))
+    return json_response(body + b'}')
+
+
+@bp.route('/cache', methods=['GET'])
+def cache_stats():
+    ''' 推薦結果キャッシュのヒット・ミス・破棄回数を返すエンドポイント
+        sessionは/recommend/sessionのスコアのキャッシュ（ミスの場合は回答から計算し直している）
+    '''
+    return jsonify({'generation': get_generation(), **result_cache.stats(),
+                    'session': session_cache.stats()})
+
+
+def parse_selection(data):
+    """ リクエストから返却件数kと絞り込み対象のdivisionを取得する
+        kは1〜MAX_Kの範囲に制限し、不正な値の場合はValueErrorを送出する
+    """
+    try:
+        k = int(data.get('k', DEFAULT_K))
+    except (TypeError, ValueError):
+        raise ValueError('k must be an integer')
+    if k < 1:
+        raise ValueError('k must be at least 1')
+    k = min(k, MAX_K)
+
+    division = data.get('division')
+    if division is not None:
+        try:
+            division = int(division)
+        except (TypeError, ValueError):
+            raise ValueError('division must be an integer')
+        if division not in DIVISIONS:
+            raise ValueError(f'division must be one of {list(DIVISIONS)}')
+    return k, division
+
+
+def parse_session_answers(answers):
+    """ セッションAPIの回答リストを(question_id, choice_id)のリストにする
+        choice_idがnullの回答は取り消し、不正な値の場合はValueErrorを送出する
+    """
+    if not isinstance(answers, list):
+        raise ValueError('answers must be a list')
+    parsed = []
     for answer in answers:
-        qcws = QuestionChoiceWeight.query.filter_by(
-            question_id=answer['questionId'], choice_id=answer['choiceId']).all()
-        for qcw in qcws:
-            feature = qcw.feature_name
-            feature_weights[feature] = feature_weights.get(
-                feature, 0.0) + qcw.weight
-
-    # 各クラブのスコア算出
-    club_scores = {}
-    for club in clubs:
-        score = 0.0
-        for feature, total_weight in feature_weights.items():
-            # クラブの該当特徴量を取得（無ければ0）
-            value = getattr(club, feature, 0)
-            score += value * total_weight
-        club_scores[club] = score
-
-    # スコアを0〜100に正規化
-    if club_scores:
-        min_score = min(club_scores.values())
-        max_score = max(club_scores.values())
-        # 全スコアを0以上に平行移動
-        if min_score < 0:
-            for club in club_scores:
-                club_scores[club] -= min_score
-        # 比率計算（max_scoreが0なら全クラブスコア0のまま）
-        if max_score > 0:
-            for club in club_scores:
-                club_scores[club] = (club_scores[club] / max_score) * 100
-
-    # 上位3クラブを選択
-    top_clubs = sorted(club_scores.keys(),
-                       key=lambda c: club_scores[c], reverse=True)[:3]
-
-    # 6. レスポンスJSON構築（不足情報はデフォルト埋め）
-    results = []
-    for club in top_clubs:
-        results.append({
-            'id': club.id,
-            'name': club.name,
-            'division': club.division,
-            'location': club.location,
-            'image_url': club.image_url,
-            'team_color': club.team_color,
-            'website_url': club.website_url,
-            'main_stadium_name': club.main_stadium_name,
-            'stadium_latitude': club.stadium_latitude,
-            'stadium_longitude': club.stadium_longitude,
-            'description': club.description,
-            'score': round(club_scores.get(club, 0), 1)
-        })
-    return jsonify({'results': results})
+        if not isinstance(answer, dict):
+            raise ValueError('each answer must be an object')
+        try:
+            question_id = int(answer['questionId'])
+            choice_id = answer.get('choiceId')
+            choice_id = None if choice_id is None else int(choice_id)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('each answer must have integer questionId and choiceId')
+        parsed.append((question_id, choice_id))
+    return parsed
+
+
+def parse_answers(answers):
+    """ 回答リストを検証し、questionId・choiceIdを整数（choiceIdは未回答の場合None）に揃えた辞書のリストにする
+        不正な値の場合はValueErrorを送出する（検証の規則はparse_session_answersと同じ）
+    """
+    return [{'questionId': question_id, 'choiceId': choice_id}
+            for question_id, choice_id in parse_session_answers(answers)]
+
+
+def json_response(body):
+    """ シリアライズ済みのJSONバイト列をそのままレスポンスとして返す
+    """
+    return Response(body, mimetype='application/json')
@@ -0,0 +1,246 @@
+import threading
+from functools import cached_property
+import numpy as np
+from .adaptive import QuestionPlanner
+from .cards import ClubCards
+from .feature_store import FeatureStore, normalize_scores
+from .weight_index import WeightIndex
+from .snapshot import snapshot_dir, read_snapshot, write_snapshot
+from ..notifications import read_generation, publish_change, register_handler
+
+# 変更通知のtopic名（クラブ・スタジアム・質問・重みの更新）
+TOPIC = 'features'
+
+
+class ServingState:
+    """ 推薦スコア計算に使うメモリ上のデータ一式
+        feature_store: クラブ×特徴量の行列
+        weight_index: 選択肢×特徴量の重み行列
+        contributions: 選択肢×クラブのスコア寄与行列（weight_index.matrix @ feature_store.matrix.T）
+        generation: 構築時の特徴量の世代番号（特徴量・重みの更新毎に増える）
+        cards: 行に対応するクラブのレスポンス用JSON（ClubCards）
+    """
+
+    def __init__(self, feature_store, weight_index, generation=0, cards=None, contributions=None):
+        self.feature_store = feature_store
+        self.weight_index = weight_index
+        self.generation = generation
+        self.cards = cards if cards is not None \
+            else ClubCards.from_cards([{'id': int(club_id)} for club_id in feature_store.club_ids])
+        # スコアは特徴量について線形なので、選択肢毎の全クラブへの寄与を事前計算しておく
+        self.contributions = contributions if contributions is not None \
+            else weight_index.matrix @ feature_store.matrix.T
+
+    @classmethod
+    def load(cls, generation=0):
+        feature_store = FeatureStore.load()
+        weight_index = WeightIndex.load(feature_store.feature_index)
+        cards = ClubCards.load(feature_store.club_ids)
+        return cls(feature_store, weight_index, generation, cards)
+
+    @classmethod
+    def from_snapshot(cls, arrays, meta):
+        """ mmapしたスナップショットから構築する（DBアクセス・行列演算なし）
+        """
+        feature_store = FeatureStore(
+            arrays['club_ids'], meta['feature_names'], arrays['feature_matrix'], arrays['divisions'])
+        weight_index = WeightIndex(
+            [tuple(key) for key in meta['weight_keys']], meta['feature_names'], arrays['weight_matrix'])
+        cards = ClubCards(arrays['card_blob'], arrays['card_offsets'])
+        return cls(feature_store, weight_index, meta['generation'], cards, arrays['contributions'])
+
+    def to_snapshot(self):
+        """ スナップショットとして書き出す配列とメタ情報を返す
+        """
+        arrays = {
+            'club_ids': self.feature_store.club_ids,
+            'divisions': self.feature_store.divisions,
+            'feature_matrix': self.feature_store.matrix,
+            'weight_matrix': self.weight_index.matrix,
+            'contributions': self.contributions,
+            'card_blob': self.cards.blob,
+            'card_offsets': self.cards.offsets,
+        }
+        meta = {
+            'generation': self.generation,
+            'feature_names': list(self.feature_store.feature_names),
+            'weight_keys': [list(key) for key in self.weight_index.keys],
+        }
+        return arrays, meta
+
+    @cached_property
+    def planner(self):
+        """ 適応的な質問順序の選択に使うQuestionPlanner（初回参照時に構築）
+        """
+        return QuestionPlanner(self)
+
+    @property
+    def club_ids(self):
+        return self.feature_store.club_ids
+
+    def answer_key(self, answers):
+        """ 回答セットを正規化したキャッシュキーを返す
+            スコアに影響しない回答（重み未定義・未回答）を除き、回答順に依存しないよう並べ替える
+        """
+        return (self.generation,) + tuple(sorted(self.weight_index.rows_for(answers)))
+
+    def raw_scores(self, answers):
+        """ 回答に対応する寄与ベクトルを合算した正規化前のスコアを返す
+        """
+        rows = self.weight_index.rows_for(answers)
+        return self.contributions[rows].sum(axis=0) if rows \
+            else np.zeros(self.feature_store.n_clubs, dtype=np.float64)
+
+    def score(self, answers):
+        """ 回答から全クラブのスコア（0〜100）を計算する
+        """
+        return normalize_scores(self.raw_scores(answers))
+
+    def score_batch(self, answer_sets):
+        """ 複数の回答セットのスコアを行列積1回でまとめて計算する
+            戻り値は回答セット×クラブのスコア行列（行毎に0〜100に正規化）
+        """
+        selection = np.zeros(
+            (len(answer_sets), self.contributions.shape[0]), dtype=np.float64)
+        for i, answers in enumerate(answer_sets):
+            np.add.at(selection[i], self.weight_index.rows_for(answers), 1.0)
+        return normalize_scores(selection @ self.contributions)
+
+    def top_k(self, scores, k, division=None):
+        """ スコア上位k件のクラブの行番号を返す（divisionを指定した場合はそのディビジョンのみ）
+        """
+        candidates = None
+        if division is not None:
+            candidates = np.flatnonzero(
+                self.feature_store.divisions == division)
+        return select_top_k(scores, self.club_ids, k, candidates)
+
+    def render_results(self, scores, top_rows, explain_answers=None):
+        """ 上位クラブの推薦結果をJSON配列のバイト列で返す
+            explain_answersを指定した場合は回答毎のスコアへの寄与を付与する
+        """
+        extras = None
+        if explain_answers is not None:
+            extras = [{'contributions': self.contributions_for(explain_answers, row)}
+                      for row in top_rows]
+        return self.cards.render(top_rows, scores, extras)
+
+    def contributions_for(self, answers, club_row):
+        """ 指定クラブのスコアに対する回答毎の寄与（正規化前）を返す
+        """
+        results = []
+        for row in sorted(self.weight_index.rows_for(answers)):
+            question_id, choice_id = self.weight_index.keys[row]
+            results.append({
+                'questionId': question_id,
+                'choiceId': choice_id,
+                'contribution': round(float(self.contributions[row, club_row]), 3)
+            })
+        return results
+
+
+def select_top_k(scores, club_ids, k, candidates=None):
+    """ 部分選択（np.partition）でスコア上位k件の行番号をO(n)で求める
+        同点の場合はクラブIDの昇順とし、レプリカ間で結果が変わらないようにする
+    """
+    rows = np.arange(len(scores)) if candidates is None \
+        else np.asarray(candidates, dtype=np.int64)
+    k = min(int(k), len(rows))
+    if k <= 0:
+        return rows[:0]
+    values = scores[rows]
+    if k < len(rows):
+        # k番目のスコア以上のクラブ（境界の同点を含む）だけに候補を絞る
+        threshold = np.partition(values, len(rows) - k)[len(rows) - k]
+        selected = values >= threshold
+        rows, values = rows[selected], values[selected]
+    # スコアの降順、同点はクラブIDの昇順で並べる
+    order = np.lexsort((club_ids[rows], -values))
+    return rows[order][:k]
+
+
+_state = None
+_generation = 0
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+
+
+def get_serving_state():
+    """ プロセス内で共有するServingStateを返す
+        スナップショットが公開されていればmmapして使い、無ければDBから構築して公開する
+    """
+    global _state
+    state = _state
+    if state is None:
+        with _lock:
+            if _state is None:
+                _state = _load_state(read_generation(TOPIC))
+            state = _state
+    return state
+
+
+def peek_serving_state():
+    """ 構築済みのServingStateを返す（未構築ならNone、構築は行わない）
+    """
+    return _state
+
+
+def _load_state(generation):
+    """ 指定世代のServingStateを構築する（_generationも更新する）
+    """
+    global _generation
+    base_dir = snapshot_dir()
+    if base_dir is not None:
+        snapshot = read_snapshot(base_dir)
+        if snapshot is not None:
+            _, arrays, meta = snapshot
+            if meta['generation'] >= generation:
+                _generation = meta['generation']
+                return ServingState.from_snapshot(arrays, meta)
+
+    state = ServingState.load(generation)
+    if base_dir is not None:
+        write_snapshot(*state.to_snapshot(), base_dir)
+    _generation = generation
+    return state
+
+
+def reload_serving_state(generation):
+    """ 変更通知を受けて新しい世代のServingStateを構築し、原子的に差し替える
+        構築中も旧世代で応答を続け、処理中のリクエストは参照中の旧世代のまま完了する
+    """
+    global _state
+    with _reload_lock:
+        if _state is not None and _state.generation >= generation:
+            return
+        state = _load_state(generation)
+        with _lock:
+            _state = state
+
+
+def get_generation():
+    """ 現在の特徴量の世代番号を返す
+    """
+    return _generation
+
+
+def invalidate_serving_state():
+    """ seedや特徴量の更新後に世代番号を進め、全サーバープロセスに再構築を通知する
+        世代番号は推薦結果キャッシュのキーに含まれるため、更新前の結果は参照されなくなる
+        スナップショットを使う場合は、DBから再構築した新しい世代を通知前に公開しておく
+    """
+    global _state
+    generation = read_generation(TOPIC) + 1
+    base_dir = snapshot_dir()
+    if base_dir is not None:
+        published = read_snapshot(base_dir)
+        if published is not None:
+            generation = max(generation, published[2]['generation'] + 1)
+    with _lock:
+        _state = None
+        if base_dir is not None:
+            _state = _load_state(generation)
+    publish_change(TOPIC, generation)
+
+
+register_handler(TOPIC, reload_serving_state)
@@ -0,0 +1,140 @@
+import base64
+import os
+import struct
+import numpy as np
+from flask import current_app
+from itsdangerous import BadSignature, TimestampSigner
+from .cache import ResultCache
+
+# トークンの有効期限（秒）
+SESSION_MAX_AGE = int(os.getenv('RECOMMEND_SESSION_MAX_AGE', 86400))
+# 1セッションで保持する回答数の上限（トークンの肥大化防止）
+MAX_SESSION_ANSWERS = 100
+# プロセス内に保持するセッションのスコアの最大件数（1件あたり8バイト×クラブ数）
+SESSION_CACHE_SIZE = int(os.getenv('RECOMMEND_SESSION_CACHE_SIZE', 1024))
+# トークンのヘッダー（セッションID, 世代番号, 回答数）と回答（question_id, choice_id）の形式
+_HEADER = struct.Struct('<16sqH')
+_ANSWER = struct.Struct('<qq')
+
+
+class InvalidSessionToken(ValueError):
+    pass
+
+
+class SessionNotConfigured(RuntimeError):
+    """ トークンの署名鍵（SECRET_KEY）が設定されていない
+        鍵をプロセス毎に生成すると、複数ワーカー構成では別のワーカーが発行したトークンを検証できないため必須とする
+    """
+
+
+class ScoreSession:
+    """ 回答途中の推薦スコアの状態（クライアントには署名付きトークンとして渡す）
+        generation: スコア計算に使った特徴量の世代番号
+        answers: question_id→choice_idの辞書（1問につき1回答）
+        raw: 正規化前の全クラブのスコア（ServingState.raw_scores(answers)と同じ値）
+        session_id: プロセス内のスコアのキャッシュ（session_cache）のキー
+        トークンにはsession_id, generation, answersのみを入れ（rawを入れると8バイト×クラブ数になるため）、
+        rawはdumps()の際にsession_cacheへ保持する。次のリクエストではキャッシュのrawに差分だけを反映し、
+        キャッシュに無い場合（別のワーカー・再起動・破棄済み）や回答・世代が合わない場合のみ回答から計算し直す
+    """
+
+    def __init__(self, generation, answers, raw=None, session_id=None):
+        self.session_id = session_id or os.urandom(16)
+        self.generation = generation
+        self.answers = dict(answers)
+        self.raw = None if raw is None else np.array(raw, dtype=np.float64)
+
+    @classmethod
+    def start(cls, state):
+        return cls(state.generation, {}, np.zeros(state.feature_store.n_clubs, dtype=np.float64))
+
+    def rebase(self, state):
+        """ トークンから復元した（rawを持たない）場合はsession_cacheのスコアを使い、
+            キャッシュに無い場合やトークン発行後に特徴量・重みが更新されていた場合は、保持している回答から計算し直す
+        """
+        if self.raw is None:
+            cached = session_cache.get(self.session_id)
+            if cached is not None:
+                generation, answers, raw = cached
+                # 同じトークンを再送した場合などに備え、回答が一致する場合のみ使う（差分反映で書き換えるためコピーする）
+                if generation == self.generation and answers == frozenset(self.answers.items()):
+                    self.raw = raw.copy()
+        if self.raw is None or self.generation != state.generation \
+                or len(self.raw) != state.feature_store.n_clubs:
+            self.raw = state.raw_scores(self.answer_list())
+            self.generation = state.generation
+
+    def apply(self, state, question_id, choice_id):
+        """ 1問分の回答（choice_idがNoneの場合は取り消し）をスコアに差分で反映する
+            変更前の選択肢の寄与ベクトルを引き、新しい選択肢の寄与ベクトルを足すだけなのでO(クラブ数)
+        """
+        key_index = state.weight_index.key_index
+        previous = self.answers.pop(question_id, None)
+        if choice_id is not None:
+            if len(self.answers) >= MAX_SESSION_ANSWERS:
+                raise ValueError(f'answers must be at most {MAX_SESSION_ANSWERS} items')
+            self.answers[question_id] = choice_id
+        old_row = key_index.get((question_id, previous))
+        new_row = key_index.get((question_id, choice_id))
+        if old_row == new_row:
+            return
+        if not any(key_index.get(key) is not None for key in self.answers.items()):
+            # 重みのある回答が無くなった場合は誤差を残さないよう0に戻す
+            self.raw[:] = 0.0
+            return
+        if old_row is not None:
+            self.raw -= state.contributions[old_row]
+        if new_row is not None:
+            self.raw += state.contributions[new_row]
+
+    def answer_list(self):
+        return [{'questionId': question_id, 'choiceId': choice_id}
+                for question_id, choice_id in self.answers.items()]
+
+    def remember(self):
+        """ 現在のスコアを次のリクエストで使えるようsession_cacheに保持する
+        """
+        session_cache.put(self.session_id, (self.generation, frozenset(self.answers.items()), self.raw))
+
+    def dumps(self) -> str:
+        """ 現在のスコアをsession_cacheに保持し、署名付きのトークン（URLセーフな文字列）にする
+            （トークンはクラブ数に関わらず16バイト×回答数程度）
+        """
+        self.remember()
+        payload = _HEADER.pack(self.session_id, self.generation, len(self.answers)) \
+            + b''.join(_ANSWER.pack(q, c) for q, c in self.answers.items())
+        return _signer().sign(base64.urlsafe_b64encode(payload).rstrip(b'=')).decode('ascii')
+
+    @classmethod
+    def loads(cls, token: str):
+        """ トークンを検証して復元する（改ざん・期限切れ・形式不正の場合はInvalidSessionToken）
+            スコアは持たないため、使う前にrebase()でキャッシュから取得するか計算する
+        """
+        try:
+            encoded = _signer().unsign(token.encode('ascii'), max_age=SESSION_MAX_AGE)
+            payload = base64.urlsafe_b64decode(encoded + b'=' * (-len(encoded) % 4))
+            session_id, generation, n_answers = _HEADER.unpack_from(payload)
+            if len(payload) != _HEADER.size + n_answers * _ANSWER.size:
+                raise ValueError('unexpected token length')
+            answers = dict(_ANSWER.unpack_from(payload, _HEADER.size + i * _ANSWER.size)
+                           for i in range(n_answers))
+        except (BadSignature, UnicodeError, ValueError, struct.error):
+            raise InvalidSessionToken('invalid session token')
+        return cls(generation, answers, session_id=session_id)
+
+
+# セッションID→(世代番号, 回答, 正規化前のスコア)。プロセス毎のため、ワーカー間では共有されない（ミス時は再計算）
+session_cache = ResultCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_MAX_AGE)
+
+
+def check_configured():
+    """ SECRET_KEYが未設定の場合はSessionNotConfiguredを送出する
+    """
+    if not current_app.config.get('SECRET_KEY'):
+        raise SessionNotConfigured(
+            'SECRET_KEY is not set. Set the same SECRET_KEY for every server process to use /recommend/session')
+
+
+def _signer():
+    check_configured()
+    return TimestampSigner(current_app.config['SECRET_KEY'], salt='recommend-session')
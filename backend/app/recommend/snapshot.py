@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import numpy as np
+from pathlib import Path
+
+# 推薦用データのスナップショットを置くディレクトリ（未設定の場合はスナップショットを使わない）
+# gunicornなど複数ワーカーで動かす場合に設定すると、全ワーカーが同じファイルを読み取り専用でmmapする
+SNAPSHOT_DIR = os.getenv('SERVING_SNAPSHOT_DIR')
+# 現在のバージョン名を記録するポインタファイル
+CURRENT_FILE = 'CURRENT'
+# 古いバージョンを残しておく数（読み込み中のワーカーがいても問題ないよう余裕を持たせる）
+KEEP_VERSIONS = 3
+
+ARRAY_NAMES = ('club_ids', 'divisions', 'feature_matrix',
+               'weight_matrix', 'contributions', 'card_blob', 'card_offsets')
+
+
+def snapshot_dir():
+    return Path(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
+
+def write_snapshot(arrays, meta, base_dir):
+    """ 配列とメタ情報をバージョン毎のディレクトリに書き出し、ポインタを差し替えて公開する
+        ディレクトリの作成・ポインタの差し替えはいずれもrenameで行うため、
+        読み込み側が書きかけのスナップショットを参照することはない
+    """
+    base_dir = Path(base_dir)
+    base_dir.mkdir(parents=True, exist_ok=True)
+    version = f'{meta["generation"]:08d}-{uuid.uuid4().hex[:8]}'
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix='.tmp-', dir=base_dir))
+    try:
+        for name in ARRAY_NAMES:
+            np.save(tmp_dir / f'{name}.npy',
+                    np.ascontiguousarray(arrays[name]))
+        with open(tmp_dir / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.rename(tmp_dir, base_dir / version)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # ポインタファイルを原子的に差し替える
+    fd, tmp_pointer = tempfile.mkstemp(prefix='.tmp-', dir=base_dir)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(tmp_pointer, base_dir / CURRENT_FILE)
+
+    _remove_old_versions(base_dir, version)
+    return version
+
+
+def current_version(base_dir):
+    """ 公開中のスナップショットのバージョン名を返す（無ければNone）
+    """
+    try:
+        with open(Path(base_dir) / CURRENT_FILE, 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_snapshot(base_dir):
+    """ 公開中のスナップショットを読み取り専用でmmapして返す
+        戻り値は(version, arrays, meta)、スナップショットが無ければNone
+    """
+    version = current_version(base_dir)
+    if version is None:
+        return None
+    path = Path(base_dir) / version
+    try:
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode='r')
+                  for name in ARRAY_NAMES}
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        # ポインタ読み込み後に古いバージョンとして削除された場合
+        return None
+    return version, arrays, meta
+
+
+def _remove_old_versions(base_dir, keep_version):
+    versions = sorted((p for p in base_dir.iterdir()
+                       if p.is_dir() and not p.name.startswith('.')),
+                      key=lambda p: p.stat().st_mtime)
+    for path in versions[:-KEEP_VERSIONS]:
+        if path.name != keep_version:
+            # mmap済みのワーカーはunlink後もinodeを参照し続けられる
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,73 @@
+import numpy as np
+from ..extensions import db
+from ..models import QuestionChoiceWeight
+
+
+class WeightIndex:
+    """ 質問・選択肢の組→特徴量の重みベクトルをコンパイルした索引
+        keys: 行に対応する(question_id, choice_id)のリスト
+        key_index: (question_id, choice_id)→行番号の辞書
+        matrix: 選択肢×特徴量の重み行列（列順はFeatureStoreと同じ）
+    """
+
+    def __init__(self, keys, feature_names, matrix):
+        self.keys = list(keys)
+        self.key_index = {key: i for i, key in enumerate(self.keys)}
+        self.feature_names = tuple(feature_names)
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+
+    @classmethod
+    def compile(cls, weights, feature_index):
+        """ (question_id, choice_id, feature_name, weight)の列から重み行列を組み立てる
+            特徴量行列に存在しないfeature_nameはここでエラーにする
+        """
+        keys = []
+        key_index = {}
+        entries = []
+        for question_id, choice_id, feature_name, weight in weights:
+            col = feature_index.get(feature_name)
+            if col is None:
+                raise ValueError(
+                    f'unknown feature_name "{feature_name}" '
+                    f'(question_id={question_id}, choice_id={choice_id})')
+            key = (question_id, choice_id)
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            entries.append((key_index[key], col, weight or 0.0))
+
+        feature_names = sorted(feature_index, key=feature_index.get)
+        matrix = np.zeros((len(keys), len(feature_names)), dtype=np.float64)
+        for row, col, weight in entries:
+            matrix[row, col] += weight
+        return cls(keys, feature_names, matrix)
+
+    @classmethod
+    def load(cls, feature_index):
+        """ question_choice_weightsを1クエリで全件取得してコンパイルする
+        """
+        rows = db.session.query(
+            QuestionChoiceWeight.question_id,
+            QuestionChoiceWeight.choice_id,
+            QuestionChoiceWeight.feature_name,
+            QuestionChoiceWeight.weight,
+        ).order_by(QuestionChoiceWeight.id).all()
+        return cls.compile(rows, feature_index)
+
+    def rows_for(self, answers):
+        """ 回答リストに対応する行番号のリストを返す
+            重みが定義されていない回答（「気にしない」など）や未回答は除外する
+        """
+        rows = []
+        for answer in answers:
+            row = self.key_index.get(
+                (answer.get('questionId'), answer.get('choiceId')))
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def aggregate(self, answers):
+        """ 回答リストの重みベクトルを合算する（DBアクセスなし）
+        """
+        return self.matrix[self.rows_for(answers)].sum(axis=0)
+
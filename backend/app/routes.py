@@ -1,6 +1,14 @@
-from flask import Blueprint, jsonify
+import logging
+import threading
+from flask import Blueprint, jsonify, current_app
 from .models import Club
 from .extensions import db
+from .recommend.serving import get_serving_state, peek_serving_state
+from .questions.payload import get_questions_payload, peek_questions_payload
+
+logger = logging.getLogger(__name__)
+_warmup_lock = threading.Lock()
+_warmup_thread = None
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -10,6 +18,51 @@ def health():
     return jsonify({'status': 'ok'})
 
 
+@bp.get('/ready')
+def ready():
+    ''' メモリ上の推薦用データと質問ペイロードが構築済みかを返すreadinessチェック
+        未構築の場合はバックグラウンドで構築を開始し、503を返す
+    '''
+    state = peek_serving_state()
+    questions = peek_questions_payload()
+    warm = state is not None and questions is not None
+    if not warm:
+        start_warmup(current_app._get_current_object())
+
+    body = {
+        'status': 'ready' if warm else 'warming',
+        'serving_state': state is not None,
+        'questions_payload': questions is not None,
+    }
+    if state is not None:
+        body['generation'] = state.generation
+        body['clubs'] = state.feature_store.n_clubs
+    return jsonify(body), 200 if warm else 503
+
+
+def start_warmup(app):
+    """ 推薦用データと質問ペイロードをバックグラウンドで構築する（同時に1スレッドのみ）
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return
+
+        def warmup():
+            with app.app_context():
+                try:
+                    get_serving_state()
+                    get_questions_payload()
+                except Exception:
+                    logger.exception('warmup failed')
+                finally:
+                    db.session.remove()
+
+        _warmup_thread = threading.Thread(
+            target=warmup, name='warmup', daemon=True)
+        _warmup_thread.start()
+
+
 @bp.get('/clubs')
 def get_clubs():
     clubs = Club.query.order_by(Club.division, Club.name).all()
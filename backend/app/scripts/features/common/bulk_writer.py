@@ -0,0 +1,101 @@
+import pandas as pd
+from sqlalchemy import text
+from ....models import Club
+from ....clubs.aliases import ClubResolver
+
+# 一時テーブル名（トランザクション終了時に破棄される）
+TEMP_TABLE = 'tmp_club_feature_updates'
+
+
+def write_club_features(conn, df: pd.DataFrame, columns: list, key: str = 'club_name',
+                        resolver: ClubResolver = None) -> dict:
+    """ DataFrameの特徴量をclubsに一括で書き込む
+
+        1. DataFrameの各行をClubResolverでclubs.idに解決（club_id列があればそれを優先）
+           あいまい一致では別のクラブの値を上書きしかねないため、完全一致（正規化キー・別表記）のみで解決する
+        2. clubsと同じ型の一時テーブルを作成し、解決できた全行をexecutemanyで投入
+        3. UPDATE ... FROM で一時テーブルとclubsを主キーで結合し、値が変わる行のみ1文で更新
+        key: DataFrame側のクラブを識別する列（正式名・略称・別表記のいずれでも可）
+        戻り値: {'matched': 照合できた行数, 'updated': 実際に値が変わった行数,
+                 'unmatched': 照合できなかったキーのリスト,
+                 'suggestions': 照合できなかったキーのうち、あいまい一致する候補がある(入力, 候補, スコア)のリスト}
+    """
+    _validate_columns(columns)
+    if resolver is None:
+        resolver = ClubResolver.load(conn)
+
+    club_ids = resolver.resolve_all(df[key], fuzzy=False)
+    if 'club_id' in df.columns:
+        # 収集スクリプトで解決済みのIDを優先する
+        club_ids = [int(given) if not pd.isna(given) else resolved
+                    for given, resolved in zip(df['club_id'], club_ids)]
+    df = df.assign(club_id=club_ids)
+    unmatched = [str(k) for k in df.loc[df['club_id'].isna(), key]]
+    suggestions = [match for match in map(resolver.suggest, unmatched) if match is not None]
+
+    # 同じクラブが複数行ある場合は従来の行毎の更新と同じく後の行を優先する
+    df = df.dropna(subset=['club_id']).drop_duplicates(
+        subset='club_id', keep='last')
+    records = [
+        {'club_id': int(row['club_id']), **{col: _to_native(row[col]) for col in columns}}
+        for row in df[['club_id'] + list(columns)].to_dict(orient='records')
+    ]
+    if not records:
+        return {'matched': 0, 'updated': 0, 'unmatched': unmatched, 'suggestions': suggestions}
+
+    col_list = ', '.join(columns)
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {TEMP_TABLE} ON COMMIT DROP AS
+        SELECT id AS club_id, {col_list} FROM clubs WITH NO DATA
+    """))
+    conn.execute(
+        text(f"""
+            INSERT INTO {TEMP_TABLE} (club_id, {col_list})
+            VALUES (:club_id, {', '.join(f':{col}' for col in columns)})
+        """),
+        records)
+
+    assignments = ', '.join(f'{col} = u.{col}' for col in columns)
+    changed = ' OR '.join(f'c.{col} IS DISTINCT FROM u.{col}' for col in columns)
+    result = conn.execute(text(f"""
+        UPDATE clubs c
+        SET {assignments}
+        FROM {TEMP_TABLE} u
+        WHERE c.id = u.club_id
+          AND ({changed})
+    """))
+    conn.execute(text(f'DROP TABLE {TEMP_TABLE}'))
+
+    return {
+        'matched': len(records),
+        'updated': result.rowcount,
+        'unmatched': unmatched,
+        'suggestions': suggestions,
+    }
+
+
+def format_report(report: dict) -> str:
+    """ write_club_featuresの結果を表示用の文字列にする
+    """
+    message = f'matched={report["matched"]}, updated={report["updated"]}, unmatched={len(report["unmatched"])}'
+    if report['unmatched']:
+        message += f' ({", ".join(map(str, report["unmatched"]))})'
+    if report.get('suggestions'):
+        # 照合できなかった表記のあいまい一致の候補（正しければseed_club_aliases.jsonに登録する）
+        message += ', suggestions=' + ', '.join(
+            f'{given}->{matched}({score})' for given, matched, score in report['suggestions'])
+    return message
+
+
+def _validate_columns(columns):
+    # カラム名はSQLに埋め込むため、clubsに実在するカラムのみ許可する
+    known = set(Club.__table__.columns.keys())
+    unknown = [col for col in columns if col not in known]
+    if unknown:
+        raise ValueError(f'unknown clubs columns: {unknown}')
+
+
+def _to_native(value):
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+class Checkpoint:
+    """ 長時間かかる収集処理の途中結果（JSON Lines、1行が1件の結果）
+        1件処理する毎に追記してfsyncするため、途中で停止しても次回は未処理の分から再開できる
+        同じキーの結果が複数ある場合は後の行を優先する（失敗した分の再取得など）
+        書き込み途中で停止した最終行は読み込み時に無視する
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.results = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.results[tuple(record['key'])] = record
+
+    def get(self, *key):
+        return self.results.get(tuple(key))
+
+    def done(self, *key, retry_failed=False):
+        """ 処理済みかどうか（retry_failed=Trueの場合は失敗した分を未処理として扱う）
+        """
+        record = self.get(*key)
+        if record is None:
+            return False
+        return not (retry_failed and record.get('error'))
+
+    def record(self, key, value=None, error=None):
+        record = {
+            'key': list(key),
+            'value': value,
+            'error': error,
+            'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.results[tuple(key)] = record
+
+    def discard(self, keys):
+        """ 指定したキーの結果を取り除き、残りの結果でファイルを書き直す（残りが無い場合はファイルを削除する）
+        """
+        with self._lock:
+            for key in keys:
+                self.results.pop(tuple(key), None)
+            if not self.results:
+                self.path.unlink(missing_ok=True)
+                return
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for record in self.results.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self.results = {}
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from .http_client import HttpClient
+from .response_cache import ResponseCache
+
+# 同時に実行するリクエスト数の上限（全ホスト合計）
+MAX_WORKERS = int(os.getenv('COLLECT_MAX_WORKERS', 8))
+# 同一ホストへの同時リクエスト数の上限
+PER_HOST = int(os.getenv('COLLECT_PER_HOST', 2))
+# 同一ホストへのリクエスト開始間隔（秒）。従来のtime.sleep(1)と同じ間隔を既定値とする
+HOST_DELAY = float(os.getenv('COLLECT_HOST_DELAY', 1.0))
+
+# ホスト名→HostLimiter（プロセス内の全Fetcherで共有し、収集スクリプトを並行実行しても同一ホストへの制限を守る）
+_host_limiters = {}
+_host_limiters_lock = threading.Lock()
+
+
+class HostLimiter:
+    """ 1ホスト分の同時実行数とリクエスト開始間隔を制御する（withで囲んだ区間が1リクエスト）
+    """
+
+    def __init__(self, concurrency, delay):
+        self.delay = delay
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        # 開始時刻を予約してから待つことで、待機中の他スレッドとも間隔を空ける
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+class Fetcher:
+    """ 収集スクリプト用のページ取得エンジン
+        スレッドプールで複数ページを並行取得し、ホスト毎に同時実行数と開始間隔を制限する
+        host_limits: ホスト名→(同時実行数, 開始間隔)でホスト毎に既定値を上書きする
+            ホスト毎の制限はプロセス内で共有され、最初にそのホストへ接続したFetcherの設定が使われる
+        client: ページ取得に使うHttpClient（既定は新しいHttpClient、集計値は実行毎）
+        cache: 応答のディスクキャッシュ（既定は環境変数COLLECT_CACHE_*の設定）
+            キャッシュから応答できる場合はホスト毎の制限を受けない
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, per_host=PER_HOST, delay=HOST_DELAY,
+                 host_limits=None, client=None, cache=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.delay = delay
+        self.host_limits = dict(host_limits or {})
+        self.client = client or HttpClient()
+        self.cache = cache or ResponseCache.from_env()
+
+    def get(self, url, params=None):
+        """ 1ページを取得して本文を返す（キャッシュに無ければホスト毎の制限に従って取得する）
+        """
+        if self.cache is not None:
+            return self.cache.get_text(url, params, self._fetch)
+        return self._fetch(url, params).text
+
+    def _fetch(self, url, params=None, headers=None):
+        with self._limiter(urlsplit(url).netloc):
+            return self.client.get(url, params, headers)
+
+    def get_many(self, targets):
+        """ 複数ページを並行取得し、targetsと同じ順序で本文のリストを返す
+            targets: URLまたは(URL, params)のリスト
+            1件でも失敗した場合は例外を送出する（従来の逐次取得と同じ）
+        """
+        targets = [(t, None) if isinstance(t, str) else t for t in targets]
+        if not targets:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as executor:
+            return list(executor.map(lambda t: self.get(*t), targets))
+
+    def _limiter(self, host):
+        with _host_limiters_lock:
+            limiter = _host_limiters.get(host)
+            if limiter is None:
+                concurrency, delay = self.host_limits.get(
+                    host, (self.per_host, self.delay))
+                limiter = _host_limiters[host] = HostLimiter(concurrency, delay)
+            return limiter
+
+    def report(self):
+        """ 実行中のHTTPリクエストとキャッシュの集計値を表示用の文字列で返す
+        """
+        if self.cache is None:
+            return self.client.format_stats()
+        return f'{self.client.format_stats()}, {self.cache.format_stats()}'
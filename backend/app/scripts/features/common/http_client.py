@@ -0,0 +1,139 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# 接続・読み込みのタイムアウト（秒）
+TIMEOUT = float(os.getenv('COLLECT_TIMEOUT', 30))
+# 失敗時の再試行回数（初回を含まない）
+MAX_RETRIES = int(os.getenv('COLLECT_MAX_RETRIES', 4))
+# 再試行の待機時間の基準値と上限（秒）。待機時間は基準値×2^試行回数を上限とした一様乱数（full jitter）
+BACKOFF_BASE = float(os.getenv('COLLECT_BACKOFF_BASE', 1.0))
+BACKOFF_MAX = float(os.getenv('COLLECT_BACKOFF_MAX', 30.0))
+# Retry-Afterで指示された待機時間の上限（秒）
+RETRY_AFTER_MAX = float(os.getenv('COLLECT_RETRY_AFTER_MAX', 120.0))
+# コネクションプールのサイズ（Fetcherの同時実行数と揃える）
+POOL_SIZE = int(os.getenv('COLLECT_MAX_WORKERS', 8))
+# 再試行の対象とするステータスコード
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = os.getenv('COLLECT_USER_AGENT', 'jclub-recommend-collector/1.0')
+
+
+class HttpClient:
+    """ 収集スクリプト共通のHTTPクライアント
+        1つのSessionでコネクションを使い回し（keep-alive）、タイムアウトと再試行を設定する
+        429/5xxと接続エラー・タイムアウトは指数バックオフ（jitter付き）で再試行し、
+        Retry-Afterヘッダーがあればその時間だけ待つ
+        stats: 実行中のリクエスト数・再試行数・失敗数・受信バイト数・レイテンシの集計
+    """
+
+    def __init__(self, timeout=TIMEOUT, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, pool_size=POOL_SIZE, session=None, sleep=time.sleep):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = session or _build_session(pool_size)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'bytes': 0,
+            'latency_seconds': 0.0,
+            'max_latency_seconds': 0.0,
+        }
+
+    def get(self, url, params=None, headers=None) -> requests.Response:
+        """ GETリクエストを送信し、成功したレスポンス（条件付きGETの304を含む）を返す
+            再試行回数を使い切った場合は最後のエラーを送出する
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.get(
+                    url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(time.perf_counter() - started, 0)
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                wait = self._backoff(attempt)
+            else:
+                self._record(time.perf_counter() - started,
+                             len(response.content))
+                if response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        self._count('failures')
+                    response.raise_for_status()
+                    return response
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    response.raise_for_status()
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After'))
+                wait = retry_after if retry_after is not None else self._backoff(
+                    attempt)
+            attempt += 1
+            self._count('retries')
+            self._sleep(wait)
+
+    def get_text(self, url, params=None) -> str:
+        return self.get(url, params).text
+
+    def format_stats(self) -> str:
+        """ 集計値を表示用の文字列にする
+        """
+        with self._lock:
+            s = dict(self.stats)
+        mean = s['latency_seconds'] / s['requests'] if s['requests'] else 0.0
+        return (f'requests={s["requests"]}, retries={s["retries"]}, failures={s["failures"]}, '
+                f'bytes={s["bytes"]}, mean_latency={mean:.3f}s, max_latency={s["max_latency_seconds"]:.3f}s')
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, elapsed, size):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += size
+            self.stats['latency_seconds'] += elapsed
+            self.stats['max_latency_seconds'] = max(
+                self.stats['max_latency_seconds'], elapsed)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def parse_retry_after(value):
+    """ Retry-Afterヘッダー（秒数またはHTTP日付）を待機秒数に変換する（解釈できなければNone）
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) -
+                       datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+def _build_session(pool_size):
+    session = requests.Session()
+    # 再試行は自前で行うため、アダプタにはプールサイズのみ設定する
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
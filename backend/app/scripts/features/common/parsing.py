@@ -0,0 +1,26 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:  # lxmlが無い環境では標準のhtml.parser
+    PARSER = 'html.parser'
+
+# 収集スクリプトが参照するページ内の要素（タグ名, 属性）
+TARGETS = {
+    'standing': ('table', {'id': 'standing'}),
+    'score_table': ('table', {'class': 'scoreTable01'}),
+    'ranking_list': ('ul', {'class': 'ranking_list'}),
+    'stats_table': ('table', {'class': 'statsTbl'}),
+    'attendance_table': ('table', {'class': 'attendance-table'}),
+    'article': ('article', {}),
+}
+
+
+def parse_target(html: str, target: str) -> BeautifulSoup:
+    """ ページのうちTARGETSで指定した要素（とその子孫）だけを解析したBeautifulSoupを返す
+        対象外の要素はツリーを作らないため、ページ全体を解析するより速く省メモリ
+        戻り値に対してはページ全体を解析した場合と同じくfind / select_oneで対象要素を取り出す
+    """
+    name, attrs = TARGETS[target]
+    return BeautifulSoup(html, PARSER, parse_only=SoupStrainer(name, attrs))
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+from flask import current_app
+
+# キャッシュの動作モード
+#   online: キャッシュを使い、期限切れの応答は条件付きGET（ETag/Last-Modified）で再検証する
+#   replay: キャッシュのみから応答する（ネットワークに接続しない。未保存のURLはCacheMiss）
+#   off: キャッシュを使わない
+MODES = ('online', 'replay', 'off')
+CACHE_MODE = os.getenv('COLLECT_CACHE_MODE', 'online')
+# 保存先ディレクトリ（未指定の場合はscripts/features/cache）
+CACHE_DIR = os.getenv('COLLECT_CACHE_DIR')
+# 再検証せずにキャッシュから応答する期間（秒）
+CACHE_TTL = float(os.getenv('COLLECT_CACHE_TTL', 3600))
+
+
+class CacheMiss(LookupError):
+    """ replayモードでキャッシュに無いURLを要求した """
+
+
+class ResponseCache:
+    """ URL+クエリパラメータをキーとしたHTTP応答のディスクキャッシュ
+        entries/<キーのハッシュ>.json: URL・ETag・Last-Modified・取得時刻・本文のハッシュ
+        blobs/<本文のハッシュ>: 本文（内容アドレスで保存するため同一内容のページは1つにまとまる）
+    """
+
+    def __init__(self, base_dir, mode='online', ttl=CACHE_TTL, clock=time.time):
+        if mode not in MODES:
+            raise ValueError(f'unknown cache mode: {mode}')
+        self.base_dir = Path(base_dir)
+        self.mode = mode
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+    @classmethod
+    def from_env(cls):
+        """ 環境変数の設定からキャッシュを作成する（offの場合はNone）
+        """
+        if CACHE_MODE == 'off':
+            return None
+        base_dir = CACHE_DIR or Path(current_app.root_path) / \
+            'scripts' / 'features' / 'cache'
+        return cls(base_dir, CACHE_MODE)
+
+    def get_text(self, url, params, fetch):
+        """ キャッシュを通してページ本文を返す
+            fetch: (url, params, headers)を受け取りrequests.Responseを返す関数（HttpClient.get）
+        """
+        key = cache_key(url, params)
+        entry = self._read_entry(key)
+        if self.mode == 'replay':
+            if entry is None:
+                raise CacheMiss(f'{url} {params or ""} is not cached')
+            return self._hit(entry, 'hits')
+        if entry is not None and self._clock() - entry['fetched_at'] < self.ttl:
+            return self._hit(entry, 'hits')
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = fetch(url, params, headers)
+        if response.status_code == 304 and entry is not None:
+            entry['fetched_at'] = self._clock()
+            self._write_json(self._entry_path(key), entry)
+            return self._hit(entry, 'revalidated')
+
+        encoding = response.encoding or response.apparent_encoding or 'utf-8'
+        digest = self._write_blob(response.content)
+        self._write_json(self._entry_path(key), {
+            'url': url,
+            'params': {str(k): str(v) for k, v in (params or {}).items()},
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': encoding,
+            'blob': digest,
+            'fetched_at': self._clock(),
+        })
+        self._count('misses')
+        return response.content.decode(encoding, errors='replace')
+
+    def format_stats(self):
+        with self._lock:
+            s = dict(self.stats)
+        return f'cache={self.mode}, hits={s["hits"]}, revalidated={s["revalidated"]}, misses={s["misses"]}'
+
+    def _hit(self, entry, kind):
+        body = self._blob_path(entry['blob']).read_bytes()
+        self._count(kind)
+        return body.decode(entry['encoding'], errors='replace')
+
+    def _count(self, kind):
+        with self._lock:
+            self.stats[kind] += 1
+
+    def _entry_path(self, key):
+        return self.base_dir / 'entries' / f'{key}.json'
+
+    def _blob_path(self, digest):
+        return self.base_dir / 'blobs' / digest[:2] / digest
+
+    def _read_entry(self, key):
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return None
+        # 本文が失われているエントリは未保存として扱う
+        return entry if self._blob_path(entry['blob']).exists() else None
+
+    def _write_blob(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not path.exists():
+            _atomic_write(path, content)
+        return digest
+
+    def _write_json(self, path, data):
+        _atomic_write(path, json.dumps(
+            data, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+
+
+def cache_key(url, params=None):
+    """ URLとクエリパラメータ（順序は問わない）からキャッシュキーを計算する
+    """
+    query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return hashlib.sha256(f'GET {url}?{query}'.encode('utf-8')).hexdigest()
+
+
+def _atomic_write(path, data):
+    # 並行して同じキーを書き込んでも壊れたファイルが残らないよう、一時ファイルから置き換える
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+from flask import current_app
+
+
+class SeasonHistory:
+    """ 特徴量毎のシーズン別集計結果の保存先（data/history/<feature>/）
+        <season>_j<division>.csv: (ディビジョン, シーズン)毎の集計結果
+        manifest.json: 保存済みの(ディビジョン, シーズン)と確定済みかどうか
+        終了したシーズンは確定済み（final）として一度だけ保存し、以降は上書きしない
+    """
+
+    def __init__(self, feature, base_dir=None):
+        self.feature = feature
+        self.base_dir = Path(base_dir) if base_dir else Path(current_app.root_path) / \
+            'scripts' / 'features' / 'data' / 'history' / feature
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+
+    def is_final(self, division, season) -> bool:
+        """ 確定済みかどうか（確定済みでも空の結果は取得し直すため未確定とする）
+        """
+        entry = self._manifest.get(_key(division, season), {})
+        return entry.get('final', False) and entry.get('rows', 0) > 0
+
+    def final_rows(self, division, season):
+        """ 確定済みの集計結果の行数（確定済みでなければNone）
+        """
+        if not self.is_final(division, season):
+            return None
+        return self._manifest[_key(division, season)]['rows']
+
+    def missing(self, divisions, seasons):
+        """ 確定済みでない（未保存または進行中シーズンの）(シーズン, ディビジョン)のリストを返す
+        """
+        return [(season, division) for season in seasons for division in divisions
+                if not self.is_final(division, season)]
+
+    def save(self, division, season, df: pd.DataFrame, final: bool, expected=None) -> bool:
+        """ 1ディビジョン・1シーズン分の集計結果を保存し、確定済みとして保存したかどうかを返す
+            確定済みのシーズンは上書きしない（ValueError）
+            expected: そのシーズン・ディビジョンのクラブ数（順位表などから呼び出し側で求める）
+            空の結果や行数がexpectedと合わない結果（一部のみ解析できたページ、キャッシュされたエラーページなど）は
+            final=Trueでも未確定として保存し、次回の実行で取得し直す
+        """
+        key = _key(division, season)
+        final = bool(final) and len(df) > 0 and (expected is None or len(df) == expected)
+        with self._lock:
+            if self.is_final(division, season):
+                raise ValueError(f'{self.feature} {key} is already final')
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            _atomic_write(self._path(division, season),
+                          df.to_csv(index=False).encode('utf-8'))
+            self._manifest[key] = {
+                'final': final,
+                'rows': len(df),
+                'expected': expected,
+                'saved_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            }
+            _atomic_write(self.base_dir / 'manifest.json', json.dumps(
+                self._manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'))
+        return final
+
+    def load(self, divisions, seasons) -> pd.DataFrame:
+        """ 保存済みの集計結果をseason, division列を付けて1つのDataFrameにまとめて返す
+        """
+        frames = []
+        for season in seasons:
+            for division in divisions:
+                path = self._path(division, season)
+                if _key(division, season) not in self._manifest or not path.exists():
+                    continue
+                df = _read_csv(path)
+                if df.empty:
+                    continue
+                frames.append(df.assign(season=int(season), division=division))
+        if not frames:
+            return pd.DataFrame(columns=['season', 'division'])
+        return pd.concat(frames, ignore_index=True)
+
+    def _path(self, division, season):
+        return self.base_dir / f'{season}_j{division}.csv'
+
+    def _read_manifest(self):
+        try:
+            return json.loads((self.base_dir / 'manifest.json').read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+def rolling_window(history: pd.DataFrame, seasons: list, value: str, key: str):
+    """ 集計期間の先頭シーズンに所属するクラブを基準に、過去シーズンの値を横に並べる
+        history: SeasonHistory.loadの結果
+        seasons: 集計対象シーズン（先頭が今シーズン）
+        key: シーズン間でクラブを結合する収集元サイトのクラブキー（略称・識別子など）
+            正式名が変わったクラブも収集元サイトのキーは変わらないため、クラブ名やあいまい一致では結合しない
+        戻り値: (club_name, {key}, {value}, {value}_1, ..., {value}_{n-1}のDataFrame,
+                 今シーズンのクラブに結合されなかった過去シーズンの行)
+    """
+    current = history[history['season'] == int(seasons[0])]
+    result = current[['club_name', key, value]].reset_index(drop=True)
+    current_keys = set(result[key].dropna())
+    unmatched = []
+    for i, season in enumerate(seasons[1:], start=1):
+        past = history[history['season'] == int(season)]
+        unmatched.append(past[~past[key].isin(current_keys)])
+        values = past.dropna(subset=[key]).drop_duplicates(subset=key).set_index(key)[value]
+        result[f'{value}_{i}'] = result[key].map(values)
+    unmatched = pd.concat(unmatched, ignore_index=True) if unmatched \
+        else history.iloc[0:0]
+    return result, unmatched
+
+
+def unmatched_messages(result: pd.DataFrame, unmatched: pd.DataFrame, seasons: list, value: str, key: str) -> list:
+    """ rolling_windowで結合できなかった行の説明を表示用の文字列のリストで返す
+        今シーズンのクラブで過去シーズンの値が無いもの（J参入前のシーズン、または収集元のキーが変わった可能性）と、
+        どの今シーズンのクラブにも結合されなかった過去シーズンの行（JFL降格などで圏外になったクラブ、またはキーの変更）
+    """
+    messages = []
+    for i, season in enumerate(seasons[1:], start=1):
+        missing = result.loc[result[f'{value}_{i}'].isna(), 'club_name']
+        if not missing.empty:
+            messages.append(f'[{season}] no value for: {", ".join(map(str, missing))}')
+    for row in unmatched.itertuples(index=False):
+        messages.append(f'[{row.season}] J{row.division} {row.club_name} ({key}={getattr(row, key)}) '
+                        f'not joined to any current club')
+    return messages
+
+
+def _key(division, season):
+    return f'{season}-j{division}'
+
+
+def _read_csv(path):
+    try:
+        return pd.read_csv(path)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+def _atomic_write(path, data):
+    # 書き込み途中で中断しても壊れたファイルが残らないよう、一時ファイルから置き換える
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,74 @@
+from sqlalchemy import text
+from .bulk_writer import _validate_columns
+
+
+class SqlFeature:
+    """ DB上の値だけから計算する特徴量（clubsのカラム）の定義
+        columns: 更新するclubsのカラム
+        select: club_id列とcolumnsの各列を返すSELECT文（ウィンドウ関数・JOIN・CASE等を使って計算する）
+        update()はselectの結果とclubsを主キーで結合し、値が変わる行のみを1文のUPDATEで更新する
+        （クラブ数に関わらずDBとの往復は1回）
+    """
+
+    def __init__(self, columns, select):
+        _validate_columns(columns)
+        self.columns = list(columns)
+        self.select = select
+
+    def update_statement(self):
+        # 計算結果の列はclubsのカラムと名前が重ならないようにnew_を付け、RETURNINGでclubs側の列を参照できるようにする
+        renamed = ', '.join(f'{col} AS new_{col}' for col in self.columns)
+        assignments = ', '.join(f'{col} = u.new_{col}' for col in self.columns)
+        changed = ' OR '.join(f'clubs.{col} IS DISTINCT FROM u.new_{col}' for col in self.columns)
+        return text(f"""
+            UPDATE clubs
+            SET {assignments}
+            FROM (SELECT club_id AS new_club_id, {renamed} FROM ({self.select}) AS f) AS u
+            WHERE clubs.id = u.new_club_id
+              AND ({changed})
+            RETURNING division, name, {', '.join(self.columns)}
+        """)
+
+    def update(self, conn, params=None) -> list:
+        """ 特徴量を再計算して書き込み、値が変わったクラブの(division, name, 新しい値...)のリストを返す
+        """
+        return [tuple(row) for row in conn.execute(self.update_statement(), params or {})]
+
+
+def weighted_sum(weights: dict) -> str:
+    """ カラム名→重みの辞書から重み付き和のSQL式を作る（カラム名・重みはコード上の定数のみ渡す）
+    """
+    _validate_columns(list(weights))
+    return ' + '.join(f'{float(weight)} * {col}' for col, weight in weights.items())
+
+
+def min_max_scaled(column: str, digits: int = 3) -> str:
+    """ 0〜1のMin-MaxスケーリングのSQL式（全行の最小・最大をウィンドウ関数で求める）
+        全行が同じ値の場合は0.5、小数点以下digits桁に丸める
+    """
+    return f"""CASE
+            WHEN MAX({column}) OVER () = MIN({column}) OVER () THEN 0.5
+            ELSE ROUND(CAST(({column} - MIN({column}) OVER ())
+                            / (MAX({column}) OVER () - MIN({column}) OVER ()) AS NUMERIC), {digits})
+        END"""
+
+
+def clamp(expr: str, lower: float, upper: float) -> str:
+    """ 値をlower〜upperに制限するSQL式
+    """
+    return f"""CASE
+            WHEN ({expr}) < {lower} THEN {lower}
+            WHEN ({expr}) > {upper} THEN {upper}
+            ELSE ({expr})
+        END"""
+
+
+def format_changes(changes: list, columns: list) -> str:
+    """ SqlFeature.updateの結果を表示用の文字列にする
+    """
+    lines = []
+    for division, name, *values in sorted(changes, key=lambda row: (row[0], row[1])):
+        detail = ', '.join(f'{col}={value:.3f}' if value is not None else f'{col}=None'
+                           for col, value in zip(columns, values))
+        lines.append(f'[J{division}] {name}: {detail}')
+    return '\n'.join(lines)
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """ トークンバケット方式のレート制限
+        rate: 1秒あたりに補充するトークン数（Noneは制限なし）
+        capacity: バケットの容量（連続して実行できるリクエスト数）
+        トークンは取得時に予約するため、複数スレッドから呼び出しても平均レートを超えない
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    @classmethod
+    def per_minute(cls, count, capacity=1):
+        """ 1分あたりのリクエスト数で作成する（0以下は制限なし）
+        """
+        return cls(count / 60 if count > 0 else None, capacity)
+
+    def reserve(self) -> float:
+        """ トークンを1つ予約し、使用できるまでの待機時間（秒）を返す
+        """
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, stop_event=None) -> bool:
+        """ トークンを1つ取得するまで待つ
+            stop_eventがセットされた場合は待機を中断してFalseを返す
+        """
+        wait = self.reserve()
+        if wait <= 0:
+            return True
+        if stop_event is None:
+            time.sleep(wait)
+            return True
+        return not stop_event.wait(wait)
@@ -3,7 +3,8 @@ import pandas as pd
 from pathlib import Path
 from flask import current_app
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text, MetaData, Table, select
+from sqlalchemy import create_engine, MetaData, Table, select
+from ..common.bulk_writer import write_club_features, format_report
 
 
 # 環境変数の読み込み
@@ -21,24 +22,13 @@ def update_financial_power():
     # CSV読み込み
     df = pd.read_csv(path)
 
+    # 売上高が無いクラブは更新しない（CSVのclub_nameはクラブ略称だが、略称もClubResolverで照合できる）
+    df = df.dropna(subset=['revenue'])
+    df['financial_power'] = df['revenue'].astype(int)
+
     engine = create_engine(DATABASE_URL)
 
     with engine.begin() as conn:
-        for _, row in df.iterrows():
-            short_name = row['club_name']
-            revenue = int(row['revenue']) if not pd.isna(
-                row['revenue']) else None
-
-            if revenue is not None:
-                query = text("""
-                    UPDATE clubs
-                    SET financial_power = :financial_power
-                    WHERE normalize_alnum(short_name) = normalize_alnum(:short_name)
-                """)
-                conn.execute(
-                    query, {
-                        'financial_power': revenue,
-                        'short_name': short_name,
-                    })
-
-    print(f'financial_power updated.')
+        report = write_club_features(conn, df, ['financial_power'])
+
+    print(f'financial_power updated. {format_report(report)}')
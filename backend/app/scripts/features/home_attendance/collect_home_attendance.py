@@ -1,14 +1,14 @@
 # 入場者数を取得する対象の年を指定して実行する
 # flak collect-attendance 2025
 
-from bs4 import BeautifulSoup
 import pandas as pd
-import requests
 import numpy as np
 import os
 from flask import current_app
 from pathlib import Path
 from dotenv import load_dotenv
+from ..common.fetcher import Fetcher
+from ..common.parsing import parse_target
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -16,18 +16,20 @@ J_DATA_SITE_URL = os.getenv('J_DATA_SITE_URL')
 ATTENDANCE_COL = 6  # クラブ別入場者数の列番号
 
 
-def fetch_home_attendance(team_id, division, year):
-    """指定クラブのホーム試合入場者数リストを返す"""
-    params = {
+def attendance_params(team_id, division, year):
+    """指定クラブのホーム試合入場者数ページのクエリパラメータを返す"""
+    return {
         'competition_year': year,
         'competition_frame': division,
         'teamIds': team_id,
         'teamType': 1,  # 0: 全て, 1: ホームのみ, 2: アウェイのみ
         'teamFlag': 0,
     }
-    r = requests.get(J_DATA_SITE_URL, params=params)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, 'html.parser')
+
+
+def parse_home_attendance(html):
+    """ホーム試合入場者数ページから入場者数リストを返す"""
+    soup = parse_target(html, 'attendance_table')
 
     # Data Siteのテーブル構造を想定（class='tbl-data'）
     table = soup.find('table', class_='attendance-table')
@@ -65,15 +67,22 @@ def collect_home_attendance(year):
     club_list = teams[['club_name', 'division',
                        'team_ids']].to_dict(orient='records')
 
+    # J1のクラブから順に並べ、全クラブのページをまとめて並行取得する
+    target_clubs = [c for division in [1, 2, 3]
+                    for c in club_list if c['division'] == division]
+    fetcher = Fetcher()
+    pages = fetcher.get_many([
+        (J_DATA_SITE_URL, attendance_params(c['team_ids'], c['division'], year))
+        for c in target_clubs])
+
     results = []
-    # J1のクラブから順に処理
     for division in [1, 2, 3]:
-        target_clubs = [c for c in club_list if c['division'] == division]
-        for i, club in enumerate(target_clubs):
+        division_clubs = [(c, html) for c, html in zip(
+            target_clubs, pages) if c['division'] == division]
+        for i, (club, html) in enumerate(division_clubs):
             club_name = club['club_name']
-            team_ids = club['team_ids']
 
-            attendances = fetch_home_attendance(team_ids, division, year)
+            attendances = parse_home_attendance(html)
             if attendances:
                 # 特徴量として使うのは平均値・中央値のいずれかだが一応両方計算しておく
                 avg_att = int(round(np.mean(attendances)))
@@ -94,5 +103,6 @@ def collect_home_attendance(year):
     out_path = Path(current_app.root_path) / 'scripts' / \
         'features' / 'data' / f'home_attendance_raw.csv'
     df_out.to_csv(out_path, index=False, encoding='utf-8-sig')
+    print(f'HTTP: {fetcher.report()}')
     print(f'Output {out_path}')
     print('Process finished.')
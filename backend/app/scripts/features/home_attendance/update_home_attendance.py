@@ -2,8 +2,9 @@ import pandas as pd
 import os
 from flask import current_app
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from ..common.bulk_writer import write_club_features, format_report
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -27,24 +28,13 @@ def update_home_attendance():
     elif USE_VALUE == 'average':
         df['home_attendance'] = df['avg_attendance']
 
+    # 値が無いクラブは更新しない
+    df = df.dropna(subset=['home_attendance'])
+    df['home_attendance'] = df['home_attendance'].astype(int)
+
     engine = create_engine(DATABASE_URL)
 
     with engine.begin() as conn:
-        for _, row in df.iterrows():
-            club_name = row['club_name']
-            home_attendance = int(row['home_attendance']) if not pd.isna(
-                row['home_attendance']) else None
-
-            if home_attendance is not None:
-                query = text("""
-                    UPDATE clubs
-                    SET home_attendance = :home_attendance
-                    WHERE normalize_alnum(name) = normalize_alnum(:club_name)
-                """)
-                conn.execute(
-                    query, {
-                        'home_attendance': home_attendance,
-                        'club_name': club_name,
-                    })
-
-    print(f'home_attendance updated using {USE_VALUE} values.')
+        report = write_club_features(conn, df, ['home_attendance'])
+
+    print(f'home_attendance updated using {USE_VALUE} values. {format_report(report)}')
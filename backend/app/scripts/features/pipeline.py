@@ -0,0 +1,268 @@
+""" 特徴量の収集（collect）と更新（update）をまとめて実行するパイプライン
+    flask features run [--year 2025] [--only update-titles ...] [--no-collect] [--force] [--dry-run]
+
+    ステージ間の依存関係（DAG）に従い、依存の無いステージは並行して実行する
+    updateステージは入力（CSVの内容・DB上の参照カラム）のハッシュを前回成功時と比較し、変化が無ければスキップする
+    いずれかのupdateステージを実行した場合のみ、最後に1回だけ推薦用特徴量の世代番号を進める
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from flask import current_app
+from sqlalchemy import text
+from ...extensions import db
+
+
+class Stage:
+    """ パイプラインの1ステージ
+        name: ステージ名（CLIコマンド名と同じ）
+        run: 実行する関数（引数は対象シーズンの西暦）
+        deps: 先に完了している必要があるステージ名
+        files: 入力となるdataディレクトリ内のファイル（globパターン可）
+        query: 入力となるDB上の値を取得するSQL（結果をハッシュに含める）
+        collect: Webから収集するステージ（入力のハッシュを持たないため常に実行する）
+    """
+
+    def __init__(self, name, run, deps=(), files=(), query=None, collect=False):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.files = tuple(files)
+        self.query = query
+        self.collect = collect
+
+    def input_hash(self, year):
+        """ 入力ファイルの内容とSQLの結果からハッシュを計算する
+        """
+        h = hashlib.sha256(self.name.encode('utf-8'))
+        data_dir = _data_dir()
+        for pattern in self.files:
+            for path in sorted(data_dir.glob(pattern)):
+                h.update(path.name.encode('utf-8'))
+                h.update(path.read_bytes())
+        if self.query is not None:
+            for row in db.session.execute(text(self.query)):
+                h.update(repr(tuple(row)).encode('utf-8'))
+            db.session.rollback()
+        return h.hexdigest()
+
+
+def _collect_attendance(year):
+    from .home_attendance.collect_home_attendance import collect_home_attendance
+    collect_home_attendance(year=year)
+
+
+def _collect_strength_long(year):
+    from .strength.collect_strength_long_term import collect_strength_long_term
+    collect_strength_long_term(current_year=year)
+
+
+def _collect_strength_short(year):
+    from .strength.collect_strength_short_term import collect_strength_short_term
+    collect_strength_short_term()
+
+
+def _collect_play_style(year):
+    from .play_style.collect_play_style import collect_play_style
+    collect_play_style(year=year)
+
+
+def _collect_youth(year):
+    from .youth_promotion_score.collect_youth_promotion_score import collect_youth_promotion_score
+    collect_youth_promotion_score(current_year=year)
+
+
+def _update_attendance(year):
+    from .home_attendance.update_home_attendance import update_home_attendance
+    update_home_attendance()
+
+
+def _update_availability(year):
+    from .ticket_availability.update_ticket_availability import update_ticket_availability
+    update_ticket_availability()
+
+
+def _update_strength_long(year):
+    from .strength.update_strength import update_strength
+    update_strength(term='long')
+
+
+def _update_strength_short(year):
+    from .strength.update_strength import update_strength
+    update_strength(term='short')
+
+
+def _update_play_style(year):
+    from .play_style.update_play_style import update_play_style
+    update_play_style()
+
+
+def _update_youth(year):
+    from .youth_promotion_score.update_youth_promotion_score import update_youth_promotion_score
+    update_youth_promotion_score()
+
+
+def _update_popularity(year):
+    from .popularity_score.update_popularity_score import update_popularity_score
+    update_popularity_score()
+
+
+def _update_financial_power(year):
+    from .financial_power.update_financial_power import update_financial_power
+    update_financial_power()
+
+
+def _update_titles(year):
+    from .titles.update_titles import update_titles
+    update_titles()
+
+
+# collect-popularityはAPIの利用制限があるためパイプラインには含めず、収集済みのCSVのみを入力とする
+STAGES = [
+    Stage('collect-attendance', _collect_attendance, collect=True),
+    Stage('collect-strength-long', _collect_strength_long, collect=True),
+    Stage('collect-strength-short', _collect_strength_short, collect=True),
+    Stage('collect-play-style', _collect_play_style, collect=True),
+    # トップ昇格人数の確定判定に順位表のクラブ数を使う
+    Stage('collect-youth', _collect_youth, deps=['collect-strength-long'], collect=True),
+    Stage('update-attendance', _update_attendance,
+          deps=['collect-attendance'], files=['home_attendance_raw.csv']),
+    # チケットの取りやすさはホーム観客数とスタジアム収容人数から計算する
+    Stage('update-availability', _update_availability, deps=['update-attendance'],
+          query='SELECT c.id, c.division, c.home_attendance, s.capacity FROM clubs c '
+                'LEFT OUTER JOIN stadiums s ON s.id = c.main_stadium_id ORDER BY c.id'),
+    Stage('update-strength-long', _update_strength_long,
+          deps=['collect-strength-long'], files=['strength_long_term.csv']),
+    Stage('update-strength-short', _update_strength_short,
+          deps=['collect-strength-short'], files=['strength_short_term.csv']),
+    Stage('update-play-style', _update_play_style,
+          deps=['collect-play-style'], files=['play_style.csv']),
+    Stage('update-youth', _update_youth,
+          deps=['collect-youth'], files=['youth_promotion_score.csv']),
+    Stage('update-popularity', _update_popularity,
+          files=['popularity_raw_j*.csv']),
+    Stage('update-financial-power', _update_financial_power,
+          files=['j_kessan-2024.csv']),
+    # タイトル数の指標はseedで投入するwin_*カラムから計算する
+    Stage('update-titles', _update_titles,
+          query='SELECT id, division, win_j1, win_j2, win_j3, win_emperor, win_levain, '
+                'win_acl, win_acl2 FROM clubs ORDER BY id'),
+]
+
+
+class PipelineState:
+    """ ステージ毎の前回成功時の入力ハッシュ（instance/feature_pipeline.json）
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            self.stages = json.loads(self.path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            self.stages = {}
+
+    def unchanged(self, name, input_hash):
+        return self.stages.get(name, {}).get('input_hash') == input_hash
+
+    def record(self, name, input_hash):
+        with self._lock:
+            self.stages[name] = {
+                'input_hash': input_hash,
+                'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.stages, indent=2,
+                           sort_keys=True), encoding='utf-8')
+            tmp.replace(self.path)
+
+
+def select_stages(only=None, no_collect=False):
+    """ 実行対象のステージを定義順（依存関係を満たす順）で返す
+    """
+    names = {stage.name for stage in STAGES}
+    unknown = set(only or []) - names
+    if unknown:
+        raise ValueError(f'unknown stages: {", ".join(sorted(unknown))}')
+    return [stage for stage in STAGES
+            if (not only or stage.name in only) and not (no_collect and stage.collect)]
+
+
+def run_pipeline(year, only=None, no_collect=False, force=False, dry_run=False, workers=4):
+    """ ステージをDAGに従って実行し、ステージ名→結果（ran, skipped, failed, blocked）の辞書を返す
+        選択外のステージへの依存は満たされているものとして扱う
+        updateステージはclubsの同じ行を更新するため1つずつ実行する（collectステージは並行実行）
+    """
+    app = current_app._get_current_object()
+    stages = select_stages(only, no_collect)
+    selected = {stage.name for stage in stages}
+    state = PipelineState(Path(app.instance_path) / 'feature_pipeline.json')
+    db_lock = threading.Lock()
+    results = {}
+
+    def execute(stage):
+        with app.app_context():
+            if stage.collect:
+                return _run(stage, year, dry_run)
+            with db_lock:
+                # 依存ステージの完了後に入力のハッシュを計算する
+                input_hash = stage.input_hash(year)
+                if not force and state.unchanged(stage.name, input_hash):
+                    print(f'[{stage.name}] skipped (inputs unchanged)')
+                    return 'skipped'
+                status = _run(stage, year, dry_run)
+                if status == 'ran' and not dry_run:
+                    state.record(stage.name, input_hash)
+                return status
+
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for stage in list(pending):
+                deps = [d for d in stage.deps if d in selected]
+                if any(results.get(d) in ('failed', 'blocked') for d in deps):
+                    results[stage.name] = 'blocked'
+                    pending.remove(stage)
+                    print(f'[{stage.name}] blocked (dependency failed)')
+                elif all(d in results for d in deps):
+                    running[executor.submit(execute, stage)] = stage
+                    pending.remove(stage)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future).name] = future.result()
+
+    # いずれかのupdateステージで特徴量が更新された場合のみ世代番号を1回だけ進める
+    updated = [stage.name for stage in stages
+               if not stage.collect and results.get(stage.name) == 'ran']
+    if updated and not dry_run:
+        from ...recommend.serving import invalidate_serving_state
+        invalidate_serving_state()
+        print(f'Serving feature generation bumped ({", ".join(updated)})')
+    return results
+
+
+def _run(stage, year, dry_run):
+    if dry_run:
+        print(f'[{stage.name}] would run')
+        return 'ran'
+    print(f'[{stage.name}] started')
+    started = time.perf_counter()
+    try:
+        stage.run(year)
+    except Exception as e:
+        print(f'[{stage.name}] failed: {e!r}')
+        return 'failed'
+    print(f'[{stage.name}] finished in {time.perf_counter() - started:.1f}s')
+    return 'ran'
+
+
+def _data_dir():
+    return Path(current_app.root_path) / 'scripts' / 'features' / 'data'
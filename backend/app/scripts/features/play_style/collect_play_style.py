@@ -1,8 +1,6 @@
 # 今シーズンの西暦を指定して実行する
 # flak collect-play-style 2025
 
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import os
 import re
@@ -10,6 +8,8 @@ from flask import current_app
 from pathlib import Path
 from dotenv import load_dotenv
 from functools import reduce
+from ..common.fetcher import Fetcher
+from ..common.parsing import parse_target
 
 
 # 環境変数の読み込み
@@ -55,14 +55,11 @@ DEFENSE_WEIGHTS = {
 REVERSE_INDICATORS = {'ball_rate', 'suffer_shoot', 'lost'}
 
 
-def fetch_jstats_metric(division: int, year: int) -> pd.DataFrame:
-    """ JSTATSから各種指標を取得する """
+def parse_jstats_metric(pages: dict) -> pd.DataFrame:
+    """ JSTATSの指標毎のランキングページ（指標名→HTML）から各種指標を抽出する """
     metric_dfs = []
     for metric in JSTATS_METRICS:
-        url = J_LEAGUE_URL.format(division=division, year=year, metric=metric)
-        r = requests.get(url)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, 'html.parser')
+        soup = parse_target(pages[metric], 'ranking_list')
         # 指標ランキングのリストを抽出
         ul = soup.find('ul', class_='ranking_list')
         if not ul:
@@ -82,13 +79,9 @@ def fetch_jstats_metric(division: int, year: int) -> pd.DataFrame:
     return reduce(lambda x, y: pd.merge(x, y, on='club_name', how='inner'), metric_dfs)
 
 
-def fetch_agi_kagi(division: int, year: int) -> pd.DataFrame:
-    """ Football LAB からAGIとKAGIを取得する """
-    params = {'year': year, 'data': 'kagi'}
-    url = FOOTBALL_LAB_URL.format(division=division)
-    r = requests.get(url, params=params)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, 'html.parser')
+def parse_agi_kagi(html: str) -> pd.DataFrame:
+    """ Football LAB のランキングページからAGIとKAGIを抽出する """
+    soup = parse_target(html, 'stats_table')
     # 指標ランキングのテーブルを抽出（AGIとKAGIの2テーブル）
     tables = soup.find_all('table', class_='statsTbl')
     if not tables:
@@ -160,12 +153,23 @@ def calculate_play_style_scores(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def collect_play_style(year):
+    # J1〜J3のJSTATS全指標とFootball LABのページをまとめて並行取得する（ホスト毎に同時実行数を制限）
+    targets = [(division, metric) for division in [1, 2, 3]
+               for metric in list(JSTATS_METRICS) + ['agi_kagi']]
+    fetcher = Fetcher()
+    pages = dict(zip(targets, fetcher.get_many([
+        (FOOTBALL_LAB_URL.format(division=division), {'year': year, 'data': 'kagi'})
+        if metric == 'agi_kagi' else
+        J_LEAGUE_URL.format(division=division, year=year, metric=metric)
+        for division, metric in targets])))
+
     combined = []
     for division in [1, 2, 3]:
         # JSTATSから指標を取得
-        jstats_df = fetch_jstats_metric(division, year)
+        jstats_df = parse_jstats_metric(
+            {metric: pages[(division, metric)] for metric in JSTATS_METRICS})
         # Football LAB から指標を取得
-        flab_df = fetch_agi_kagi(division, year)
+        flab_df = parse_agi_kagi(pages[(division, 'agi_kagi')])
         # クラブ名を軸にjstats_dfとflab_dfをまとめる
         merged = pd.merge(jstats_df, flab_df, on='club_name', how='inner')
         combined.append(merged)
@@ -179,5 +183,6 @@ def collect_play_style(year):
     out_path = Path(current_app.root_path) / 'scripts' / \
         'features' / 'data' / 'play_style.csv'
     output_df.to_csv(out_path, index=False, encoding='utf-8-sig')
+    print(f'HTTP: {fetcher.report()}')
     print(f"Output {out_path}")
     print("Process finished.")
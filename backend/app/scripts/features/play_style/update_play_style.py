@@ -2,8 +2,9 @@ import pandas as pd
 import os
 from flask import current_app
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from ..common.bulk_writer import write_club_features, format_report
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -19,29 +20,13 @@ def update_play_style():
     # CSV読み込み
     df = pd.read_csv(path)
 
+    # 攻撃・守備のどちらかが欠けているクラブは更新しない
+    columns = ['play_style_attack', 'play_style_defense']
+    df = df.dropna(subset=columns)
+
     engine = create_engine(DATABASE_URL)
 
     with engine.begin() as conn:
-        for _, row in df.iterrows():
-            club_name = row['club_name']
-            play_style_attack = float(row['play_style_attack']) if not pd.isna(
-                row['play_style_attack']) else None
-            play_style_defense = float(row['play_style_defense']) if not pd.isna(
-                row['play_style_defense']) else None
-
-            if play_style_attack is not None and play_style_defense is not None:
-                query = text("""
-                    UPDATE clubs
-                    SET
-                        play_style_attack = :play_style_attack,
-                        play_style_defense = :play_style_defense
-                    WHERE normalize_alnum(name) = normalize_alnum(:club_name)
-                """)
-                conn.execute(
-                    query, {
-                        'play_style_attack': play_style_attack,
-                        'play_style_defense': play_style_defense,
-                        'club_name': club_name,
-                    })
-
-    print('play_style_attack and play_style_defense updated.')
+        report = write_club_features(conn, df, columns)
+
+    print(f'play_style_attack and play_style_defense updated. {format_report(report)}')
@@ -0,0 +1,98 @@
+""" SNSのフォロワー数・登録者数を取得するプラットフォーム毎のクライアント
+    いずれもfollowers(account)で1アカウント分の数値を返し、取得できない場合は例外を送出する
+    各クライアントは1スレッドからのみ呼び出す（instaloaderのセッションはスレッドセーフではないため）
+    外部ライブラリは生成時に読み込むため、FakeClientだけを使う場合はインストール不要
+"""
+import hashlib
+import os
+import random
+import time
+
+
+class InstagramClient:
+    platform = 'instagram'
+    account_key = 'instagram_user_name'
+
+    def __init__(self):
+        import instaloader
+        self._instaloader = instaloader
+        self.loader = instaloader.Instaloader()
+        # Instagramはログインした方がアクセス制限が緩い
+        username = os.getenv('INSTAGRAM_USERNAME')
+        if username:
+            self.loader.login(username, os.getenv('INSTAGRAM_PASSWORD'))
+
+    def followers(self, account):
+        profile = self._instaloader.Profile.from_username(
+            self.loader.context, account)
+        return int(profile.followers)
+
+
+class TwitterClient:
+    """ TwitterはApifyのactorを利用
+    """
+    platform = 'twitter'
+    account_key = 'twitter_user_name'
+
+    def __init__(self):
+        from apify_client import ApifyClient
+        self.client = ApifyClient(os.getenv('APIFY_TOKEN'))
+        self.actor = os.getenv('TWITTER_ACTOR')
+
+    def followers(self, account):
+        run = self.client.actor(self.actor).call(
+            run_input={'from': account, 'maxItems': 1})
+        dataset_id = run.get('defaultDatasetId')
+        if dataset_id:
+            for item in self.client.dataset(dataset_id).iterate_items():
+                followers = (item.get('author') or {}).get('followers')
+                if followers is not None:
+                    return int(followers)
+        raise LookupError(f'followers of {account} not found')
+
+
+class YouTubeClient:
+    platform = 'youtube'
+    account_key = 'youtube_channel_id'
+
+    def __init__(self):
+        from googleapiclient.discovery import build
+        self.youtube = build('youtube', 'v3', developerKey=os.getenv('YOUTUBE_API_KEY'))
+
+    def followers(self, account):
+        res = self.youtube.channels().list(part='statistics', id=account).execute()
+        return int(res['items'][0]['statistics']['subscriberCount'])
+
+
+class FakeClient:
+    """ オフラインでの動作確認用のクライアント
+        アカウント名から決まる値を返す（何度実行しても同じ値）
+        latency: 1件あたりの応答時間（秒）
+        fail_rate: 例外を送出する割合
+    """
+
+    def __init__(self, platform, account_key, latency=0.0, fail_rate=0.0, seed=0):
+        self.platform = platform
+        self.account_key = account_key
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def followers(self, account):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._random.random() < self.fail_rate:
+            raise ConnectionError(f'fake {self.platform} error')
+        digest = hashlib.sha256(f'{self.platform}:{account}'.encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big') % 1_000_000
+
+
+def build_clients(fake=False):
+    """ 収集に使うクライアント（Instagram, Twitter, YouTube）のリストを返す
+    """
+    if fake:
+        return [FakeClient(client.platform, client.account_key)
+                for client in (InstagramClient, TwitterClient, YouTubeClient)]
+    return [InstagramClient(), TwitterClient(), YouTubeClient()]
@@ -1,95 +1,88 @@
-# APのアクセス制限に引っかかるのを回避するため、J1、J2、J3で分けて実行する（1日1回ぐらいのペースが良さそう）
-# flask collect-popularity j1
-# flask collect-popularity j2
-# flask collect-popularity j3
+# Instagram、Twitter、YouTubeのフォロワー数を並行して取得する（プラットフォーム毎にレート制限）
+# flask collect-popularity            # 全クラブ
+# flask collect-popularity j1         # J1のクラブのみ
+# flask collect-popularity --fake     # オフラインでの動作確認（ダミーの値、レート制限なし）
+# 取得結果は1件毎にdata/checkpoints/popularity.jsonlへ記録し、途中で停止（Ctrl-C、例外、実行毎の上限）しても
+# 同じコマンドを再実行すれば未取得の分から再開する。最初から取得し直す場合は--restartを指定する
+# CSVを出力したディビジョンの結果はチェックポイントから取り除くため、次回の実行では最新の値を取得し直す
+# （取得に失敗したクラブがある場合は--retry-failedで失敗した分のみ再取得できるよう残すが、
+#   --retry-failedを付けない実行では前回の結果として破棄し、そのディビジョンを最初から取得する）
 
 import pandas as pd
-import time
 import json
-import instaloader
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask import current_app
 from pathlib import Path
-from googleapiclient.discovery import build
-from apify_client import ApifyClient
 from dotenv import load_dotenv
+from ..common.checkpoint import Checkpoint
+from ..common.token_bucket import TokenBucket
+from .clients import build_clients
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
-YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
-APIFY_TOKEN = os.getenv('APIFY_TOKEN')
-TWITTER_ACTOR = os.getenv('TWITTER_ACTOR')
 START_J1_INDEX = 0
 START_J2_INDEX = 20
 START_J3_INDEX = 40
+# プラットフォーム毎の1分あたりのリクエスト数（0は制限なし）。Instagramは従来のクラブ毎1分待機と同じ間隔
+RATE_PER_MINUTE = {
+    'instagram': float(os.getenv('POPULARITY_INSTAGRAM_PER_MINUTE', 1)),
+    'twitter': float(os.getenv('POPULARITY_TWITTER_PER_MINUTE', 10)),
+    'youtube': float(os.getenv('POPULARITY_YOUTUBE_PER_MINUTE', 60)),
+}
+# プラットフォーム毎の1回の実行で送るリクエスト数の上限（0は上限なし）
+# Instagramはアクセス制限に引っかからないよう1日1ディビジョン分ぐらいのペースにし、残りは翌日以降に再開する
+MAX_PER_RUN = {
+    'instagram': int(os.getenv('POPULARITY_INSTAGRAM_MAX_PER_RUN', 20)),
+    'twitter': int(os.getenv('POPULARITY_TWITTER_MAX_PER_RUN', 0)),
+    'youtube': int(os.getenv('POPULARITY_YOUTUBE_MAX_PER_RUN', 0)),
+}
+# プラットフォーム→出力するCSVの列名
+COLUMNS = {
+    'instagram': 'instagram_followers',
+    'twitter': 'twitter_followers',
+    'youtube': 'youtube_subscribers',
+}
 
 
-def get_youtube_subs(club_account_labels):
-    """" クラブ毎の公式YouTubeチャンネルの登録者数を取得 """
-    print('--- Start getting YouTube subscribers ---')
-    youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-    subscribers = {}
-    for i, club_account_label in enumerate(club_account_labels):
-        for club_name, account_labes in club_account_label.items():
-            try:
-                req = youtube.channels().list(
-                    part='statistics', id=account_labes['youtube_channel_id'])
-                res = req.execute()
-                subscribers[club_name] = int(
-                    res['items'][0]['statistics']['subscriberCount'])
-            except Exception:
-                subscribers[club_name] = None
-        if (i + 1) % 20 == 0:
-            print(f'{i + 1} clubs processed.')
-    print('--- Finish getting YouTube subscribers ---')
-
-    return subscribers
-
+def collect_platform(client, bucket, clubs, checkpoint, stop_event, max_requests=0, retry_failed=False):
+    """ 1プラットフォーム分のフォロワー数を順に取得し、1件毎にチェックポイントへ記録する
+        取得済みのクラブは飛ばし、max_requests件送ったかstop_eventがセットされた時点で止める
+    """
+    platform = client.platform
+    sent = 0
+    for club_name, account_labels in clubs:
+        if stop_event.is_set():
+            return sent
+        if checkpoint.done(club_name, platform, retry_failed=retry_failed):
+            continue
+        if max_requests and sent >= max_requests:
+            print(f'[{platform}] reached {max_requests} requests for this run.')
+            return sent
+        account = account_labels.get(client.account_key)
+        if not account:
+            checkpoint.record((club_name, platform), error='account not set')
+            continue
+        if not bucket.acquire(stop_event):
+            return sent
+        sent += 1
+        try:
+            checkpoint.record((club_name, platform), value=client.followers(account))
+        except Exception as e:
+            checkpoint.record((club_name, platform), error=repr(e))
+        if sent % 5 == 0:
+            print(f'[{platform}] {sent} requests sent.')
+    return sent
 
-def get_instagram_twitter_followers(club_account_labels):
-    """ クラブ毎の公式Instagramのフォロワー数を取得 """
-    print('--- Start getting Instagram & Twitter followers ---')
-    loader = instaloader.Instaloader()
-    # Instagramはログインした方がアクセス制限が緩い（ユーザ名、パスワードは環境変数などに分ける）
-    loader.login("mmsr_22", "helmut407")
-    # TwitterはApifyのactorを利用
-    client = ApifyClient(APIFY_TOKEN)
-    instagram_followers = {}
-    twitter_followers = {}
-    for i, club_account_label in enumerate(club_account_labels):
-        for club_name, account_labes in club_account_label.items():
-            # Instagramのフォロワー数取得
-            try:
-                profile = instaloader.Profile.from_username(
-                    loader.context, account_labes['instagram_user_name'])
-                instagram_followers[club_name] = int(profile.followers)
-            except Exception:
-                instagram_followers[club_name] = None
-            # Twitterのフォロワー数取得
-            try:
-                run_input = {
-                    'from': account_labes['twitter_user_name'], 'maxItems': 1}
-                run = client.actor(TWITTER_ACTOR).call(run_input=run_input)
-                dataset_id = run.get('defaultDatasetId')
-                followers = None
-                if dataset_id:
-                    for item in client.dataset(dataset_id).iterate_items():
-                        author = item.get('author')
-                        followers = author.get('followers')
-                        if followers is not None:
-                            break
-                twitter_followers[club_name] = int(followers)
-            except Exception:
-                twitter_followers[club_name] = None
-        time.sleep(60)  # Instagramのアクセス制限回避のため1分待機
-        if (i + 1) % 5 == 0:
-            print(f'{i + 1} clubs processed.')
-    print('--- Finish getting Instagram & Twitter followers ---')
 
-    return instagram_followers, twitter_followers
+def division_keys(labels):
+    """ ディビジョンの全クラブ・全プラットフォームのチェックポイントのキーを返す
+    """
+    return [(club_name, platform) for club in labels for club_name in club for platform in COLUMNS]
 
 
-def collect_popularity_score(division):
+def collect_popularity_score(division='all', restart=False, retry_failed=False, fake=False):
     path = Path(current_app.root_path) / 'scripts' / \
         'features' / 'settings' / 'jleague_clubs_sns.json'
     if not path.exists():
@@ -98,31 +91,80 @@ def collect_popularity_score(division):
     with open(path, 'r', encoding='utf-8') as f:
         club_account_labels = json.load(f)
 
-    # 指定のdivisionのクラブだけ絞り込んで処理（Instagramのアクセス制限対策）
-    if division.lower() == 'j1':
-        club_account_labels = club_account_labels[START_J1_INDEX:START_J2_INDEX]
-    elif division.lower() == 'j2':
-        club_account_labels = club_account_labels[START_J2_INDEX:START_J3_INDEX]
-    elif division.lower() == 'j3':
-        club_account_labels = club_account_labels[START_J3_INDEX:]
+    # 設定ファイルの並び順でディビジョンを判定する
+    divisions = {
+        'j1': club_account_labels[START_J1_INDEX:START_J2_INDEX],
+        'j2': club_account_labels[START_J2_INDEX:START_J3_INDEX],
+        'j3': club_account_labels[START_J3_INDEX:],
+    }
+    if division.lower() != 'all':
+        if division.lower() not in divisions:
+            raise ValueError(f'unknown division: {division}')
+        divisions = {division.lower(): divisions[division.lower()]}
+    clubs = [item for labels in divisions.values()
+             for club in labels for item in club.items()]
 
-    instagram_followers, twitter_followers = get_instagram_twitter_followers(
-        club_account_labels)
-    youtube_subscribers = get_youtube_subs(club_account_labels)
+    data_dir = Path(current_app.root_path) / 'scripts' / 'features' / 'data'
+    checkpoint = Checkpoint(data_dir / 'checkpoints' / 'popularity.jsonl')
+    if restart:
+        checkpoint.clear()
+    elif not retry_failed:
+        # 全件の結果が揃っているディビジョンは前回の実行でCSVを出力済みなので、最初から取得し直す
+        for name, labels in divisions.items():
+            keys = division_keys(labels)
+            if all(checkpoint.get(*key) is not None for key in keys):
+                print(f'{name}: previous results found, collecting again.')
+                checkpoint.discard(keys)
 
-    data = []
-    for club_account_label in club_account_labels:
-        for club_name, account_labes in club_account_label.items():
-            data.append({
-                'club_name': club_name,
-                'instagram_followers': instagram_followers.get(club_name),
-                'twitter_followers': twitter_followers.get(club_name),
-                'youtube_subscribers': youtube_subscribers.get(club_name),
-            })
+    clients = build_clients(fake=fake)
+    stop_event = threading.Event()
+    print('--- Start getting SNS followers ---')
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        futures = {}
+        for client in clients:
+            # フェイクのクライアントはレート制限・上限なしで実行する
+            bucket = TokenBucket(None) if fake else TokenBucket.per_minute(
+                RATE_PER_MINUTE[client.platform])
+            max_requests = 0 if fake else MAX_PER_RUN[client.platform]
+            futures[executor.submit(collect_platform, client, bucket, clubs, checkpoint,
+                                    stop_event, max_requests, retry_failed)] = client.platform
+        try:
+            pending = set(futures)
+            while pending:
+                # Ctrl-Cを受け付けるためタイムアウト付きで待つ
+                _, pending = wait(pending, timeout=1)
+        except KeyboardInterrupt:
+            stop_event.set()
+            print('Interrupted. Run the same command again to resume.')
+        for future, platform in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f'[{platform}] stopped: {e!r}')
+    print('--- Finish getting SNS followers ---')
 
-    df = pd.DataFrame(data)
-    out_path = Path(current_app.root_path) / 'scripts' / \
-        'features' / 'data' / f'popularity_raw_{division.lower()}.csv'
-    df.to_csv(out_path, index=False, encoding='utf-8-sig')
-    print(f'Output {out_path}')
+    # 全プラットフォームの取得が終わったディビジョンのCSVを出力する
+    for name, labels in divisions.items():
+        rows, remaining = [], 0
+        for club in labels:
+            for club_name in club:
+                row = {'club_name': club_name}
+                for platform, column in COLUMNS.items():
+                    record = checkpoint.get(club_name, platform)
+                    if record is None:
+                        remaining += 1
+                    row[column] = record['value'] if record else None
+                rows.append(row)
+        if remaining:
+            print(f'{name}: {remaining} results remaining. Run again to resume.')
+            continue
+        failed = sum(row[column] is None for row in rows for column in COLUMNS.values())
+        out_path = data_dir / f'popularity_raw_{name}.csv'
+        pd.DataFrame(rows).astype({column: 'Int64' for column in COLUMNS.values()}) \
+            .to_csv(out_path, index=False, encoding='utf-8-sig')
+        if failed:
+            print(f'Output {out_path} ({failed} failed, retry with --retry-failed)')
+        else:
+            print(f'Output {out_path}')
+            checkpoint.discard(division_keys(labels))
     print('Process finished.')
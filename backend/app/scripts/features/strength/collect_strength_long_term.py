@@ -1,21 +1,27 @@
 # 今シーズンの西暦を指定して実行する
 # flak collect-strength-long 2025
 
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import os
-import time
 from flask import current_app
 from pathlib import Path
 from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from ....clubs.aliases import ClubResolver
+from ..common.fetcher import Fetcher
+from ..common.parsing import parse_target
+from ..common.season_history import SeasonHistory, rolling_window, unmatched_messages
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
+DATABASE_URL = os.getenv('DATABASE_URL')
 FOOTBALL_LAB_URL = os.getenv('FOOTBALL_LAB_URL')
 BASE_URL = FOOTBALL_LAB_URL + '/team_ranking/j{division}'
 STANDING_COL = 0  # 順位表の順位の列番号
 CLUB_NAME_COL = 2  # 順位表のクラブ名の列番号
+WINDOW_SEASONS = 5  # 長期的強さの集計対象シーズン数（今シーズンを含む）
+# シーズン毎に保存する列
+HISTORY_COLUMNS = ['club_name', 'club_name_short', 'standing', 'strength_score']
 
 # リーグ別の長期的強さスコア計算用パラメータ（base, beta）
 DIV_PARAMS = {
@@ -25,12 +31,9 @@ DIV_PARAMS = {
 }
 
 
-def fetch_standings(division: int, year: int) -> pd.DataFrame:
-    """ Football-Labからリーグ別・シーズン別の順位表を取得 """
-    url = BASE_URL.format(division=division)
-    r = requests.get(url, params={'year': year})
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, 'html.parser')
+def parse_standings(html: str, division: int) -> pd.DataFrame:
+    """ Football-Labのリーグ別・シーズン別の順位表ページから順位を抽出 """
+    soup = parse_target(html, 'standing')
 
     # 順位テーブル抽出
     table = soup.find('table', id='standing')
@@ -68,44 +71,54 @@ def calc_strength_score(standing: int, total_clubs: int, division: int) -> float
 
 
 def collect_strength_long_term(current_year) -> None:
-    # 今年+過去4シーズン分を取得
-    target_years = list(range(int(current_year), int(current_year) - 5, -1))
+    # 今年+過去4シーズン分を集計する
+    target_years = list(range(int(current_year), int(current_year) - WINDOW_SEASONS, -1))
     print(f'target_years: {target_years}')
-    all_years_data = []
-    for year in target_years:
-        # シーズン毎のJ1〜J3全クラブの強さスコアを格納するリスト
-        yearly_scores = []
-        # J1, J2, J3それぞれ順位表から計算した各クラブのスコアを取得
-        for division in [1, 2, 3]:
-            df = fetch_standings(division, year)
-            if df.empty:
-                continue
-            df['strength_score'] = df['standing'].apply(
-                lambda s: calc_strength_score(s, len(df), division)
-            )
-            yearly_scores.append(
-                df[['club_name', 'club_name_short', 'strength_score']])
-            time.sleep(1)  # スクレイピングの間隔を空けるため1秒待つ
-
-        # 1シーズン毎のJ1〜J3全クラブの強さスコアを1つのDataFrameにまとめall_years_dataに追加
-        all_years_data.append(pd.concat(yearly_scores, ignore_index=True))
-
-    # 今年のスコアDF（all_years_dataの先頭）を基準に過去シーズンのスコアDFをclub_nameでLEFT結合していく
-    # こうすることで、今シーズンJリーグに所属しているクラブのスコアだけを抽出できる
-    current_df = all_years_data[0].copy()
-    for i, past_df in enumerate(all_years_data[1:], start=1):
-        # 集計対象期間中に正式名が変更されたクラブもあるので、結合にはクラブ略称を使い重複するクラブ名のカラムは除く
-        current_df = current_df.merge(
-            past_df[['club_name_short', 'strength_score']],
-            on='club_name_short', how='left', suffixes=('', f'_{i}')
+    history = SeasonHistory('strength_long_term')
+
+    # 確定済みのシーズンは保存済みの結果を使い、今シーズンと未保存のシーズンの順位表ページのみ取得する
+    targets = history.missing([1, 2, 3], target_years)
+    fetcher = Fetcher()
+    pages = fetcher.get_many([
+        (BASE_URL.format(division=division), {'year': year}) for year, division in targets])
+    for (year, division), html in zip(targets, pages):
+        df = parse_standings(html, division).reindex(columns=HISTORY_COLUMNS[:-1])
+        df['strength_score'] = df['standing'].apply(
+            lambda s: calc_strength_score(s, len(df), division)
         )
+        # 終了したシーズンは確定済みとして保存し、次回以降は取得しない
+        # クラブ数は順位表の最下位の順位とし、順位が1から連番でない場合は解析に失敗したとみなして未確定のまま次回取得し直す
+        ranked = sorted(df['standing']) == list(range(1, len(df) + 1))
+        final = year < int(current_year)
+        saved_final = history.save(division, year, df[HISTORY_COLUMNS], final=final and ranked,
+                                   expected=len(df) if ranked else None)
+        if final and not saved_final:
+            print(f'[{year}] J{division}: standings incomplete ({len(df)} rows), saved as not final')
+    print(f'fetched: {targets}')
+
+    # シーズン間の結合は従来通り収集元サイトのクラブ略称で行う（集計対象期間中に正式名が変更されたクラブも略称は変わらない）
+    all_years_data = history.load([1, 2, 3], target_years)
+    current_df, unmatched = rolling_window(
+        all_years_data, target_years, 'strength_score', key='club_name_short')
+    for message in unmatched_messages(current_df, unmatched, target_years, 'strength_score', key='club_name_short'):
+        print(message)
+
+    # 更新スクリプトでの照合用に今シーズンのクラブだけをclubs.idに解決する（あいまい一致は使わない）
+    with create_engine(DATABASE_URL).connect() as conn:
+        resolver = ClubResolver.load(conn)
+    current_df['club_id'] = pd.array(resolver.resolve_all(
+        current_df['club_name'], current_df['club_name_short'], fuzzy=False), dtype='Int64')
+    unresolved = current_df.loc[current_df['club_id'].isna(), 'club_name']
+    if not unresolved.empty:
+        print(f'Unresolved clubs: {", ".join(unresolved)}')
+    # 結合に使ったキーの出力は不要なので削除
+    current_df = current_df.drop(columns=['club_name_short'])
 
     # 各クラブ毎に5シーズン分のスコアを平均して長期的な強さのスコアを計算
-    numeric_cols = current_df.select_dtypes(include='number')
+    numeric_cols = current_df.drop(
+        columns=['club_id']).select_dtypes(include='number')
     current_df['strength_long_term'] = numeric_cols.mean(axis=1).round(3)
-    print(current_df)
-    # 結合に使ったクラブ略称カラムの出力は不要なので削除
-    current_df = current_df.drop(columns=['club_name_short'])
+    # クラブIDは更新スクリプトでの照合に使うため出力に残す
 
     print('')
     print('current_df')
@@ -114,5 +127,6 @@ def collect_strength_long_term(current_year) -> None:
     out_path = Path(current_app.root_path) / 'scripts' / \
         'features' / 'data' / f'strength_long_term.csv'
     current_df.to_csv(out_path, index=False, encoding='utf-8-sig')
+    print(f'HTTP: {fetcher.report()}')
     print(f'Output {out_path}')
     print('Process finished.')
@@ -1,14 +1,14 @@
 # 今シーズンの西暦を指定して実行する
 # flak collect-strength-long 2025
 
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import os
 import numpy as np
 from flask import current_app
 from pathlib import Path
 from dotenv import load_dotenv
+from ..common.fetcher import Fetcher
+from ..common.parsing import parse_target
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -47,12 +47,9 @@ def normalize_points(points: list[int]) -> float:
     return float(round(np.sum(points) / max_point, 3))
 
 
-def fetch_recent_match_results(division: int):
-    """ Jリーグ公式サイトから順位表を取得し直近5試合の結果を抽出 """
-    url = BASE_URL.format(division=division)
-    r = requests.get(url)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, 'html.parser')
+def parse_recent_match_results(html: str):
+    """ Jリーグ公式サイトの順位表ページから直近5試合の結果を抽出 """
+    soup = parse_target(html, 'score_table')
     # 試合結果テーブル抽出
     table = soup.find('table', class_='scoreTable01')
     if not table:
@@ -75,10 +72,14 @@ def fetch_recent_match_results(division: int):
 
 
 def collect_strength_short_term() -> None:
+    # J1〜J3の順位表ページを並行取得する
+    fetcher = Fetcher()
+    pages = fetcher.get_many(
+        [BASE_URL.format(division=division) for division in [1, 2, 3]])
     results = [
         record
-        for division in [1, 2, 3]
-        for record in fetch_recent_match_results(division)
+        for html in pages
+        for record in parse_recent_match_results(html)
     ]
 
     df_out = pd.DataFrame(results)
@@ -86,5 +87,6 @@ def collect_strength_short_term() -> None:
     out_path = Path(current_app.root_path) / 'scripts' / \
         'features' / 'data' / f'strength_short_term.csv'
     df_out.to_csv(out_path, index=False, encoding='utf-8-sig')
+    print(f'HTTP: {fetcher.report()}')
     print(f'Output {out_path}')
     print('Process finished.')
@@ -4,8 +4,9 @@ import pandas as pd
 import os
 from flask import current_app
 from pathlib import Path
-from sqlalchemy import create_engine, text, table, column
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from ..common.bulk_writer import write_club_features, format_report
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -29,25 +30,12 @@ def update_strength(term: str):
     # CSV読み込み
     df = pd.read_csv(path)
 
+    # 値が無いクラブは更新しない
+    df = df.dropna(subset=[target_feature])
+
     engine = create_engine(DATABASE_URL)
-    clubs = table('clubs', column('name'), column(f'{target_feature}'))
 
     with engine.begin() as conn:
-        for _, row in df.iterrows():
-            club_name = row['club_name']
-            strength = float(row[f'{target_feature}']) if not pd.isna(
-                row[f'{target_feature}']) else None
-
-            if strength is not None:
-                query = text(f"""
-                    UPDATE clubs
-                    SET {target_feature} = :strength
-                    WHERE normalize_alnum(name) = normalize_alnum(:club_name)
-                """)
-                conn.execute(
-                    query, {
-                        'strength': strength,
-                        'club_name': club_name,
-                    })
-
-    print(f'{target_feature} updated using.')
+        report = write_club_features(conn, df, [target_feature])
+
+    print(f'{target_feature} updated. {format_report(report)}')
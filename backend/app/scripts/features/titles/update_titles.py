@@ -1,9 +1,9 @@
 import os
 from flask import current_app
-import pandas as pd
 from pathlib import Path
-from sqlalchemy import create_engine, MetaData, Table, select, text
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from ..common.sql_features import SqlFeature, weighted_sum, min_max_scaled, format_changes
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -25,79 +25,26 @@ INTERNATIONAL_CONVENTION_WEIGHTS = {
 }
 
 
-def normalize_columns(df: pd.DataFrame, cols: list) -> float:
-    """ 0〜1のMin-Maxスケーリングを行う """
-    for col in cols:
-        print(col)
-        min_val, max_val = df[col].min(), df[col].max()
-        print(min_val, max_val)
-
-        if pd.isna(min_val) or pd.isna(max_val):
-            df[col] = None
-        elif max_val == min_val:
-            df[col] = 0.5
-        else:
-            df[col] = ((df[col] - min_val) / (max_val - min_val)).round(3)
-
-    return df
-
-
-def compute_score(df: pd.DataFrame, weights: dict) -> pd.Series:
-    cols = weights.keys()
-    for col in cols:
-        if col not in df:
-            df[col] = 0
-    weighted_sum = sum(df[col] * weight for col, weight in weights.items())
-
-    return weighted_sum
+# 重み付きのタイトル数を全クラブでMin-Maxスケーリングした値を1文で計算する
+TITLES = SqlFeature(['domestic_titles', 'international_titles'], f"""
+    SELECT club_id,
+        {min_max_scaled('domestic')} AS domestic_titles,
+        {min_max_scaled('international')} AS international_titles
+    FROM (
+        SELECT id AS club_id,
+            {weighted_sum(DOMESTIC_CONVENTION_WEIGHTS)} AS domestic,
+            {weighted_sum(INTERNATIONAL_CONVENTION_WEIGHTS)} AS international
+        FROM clubs
+    ) AS scores
+""")
 
 
 def update_titles():
     engine = create_engine(DATABASE_URL)
-    metadata = MetaData()
-    clubs = Table('clubs', metadata, autoload_with=engine)
-
-    # clubレコードの中の必要なカラムのみ指定
-    select_cols = ['name'] + list(DOMESTIC_CONVENTION_WEIGHTS.keys()) + \
-        list(INTERNATIONAL_CONVENTION_WEIGHTS.keys())
-    # キーをもとに clubs.c からカラムオブジェクトを動的に取得
-    columns = [getattr(clubs.c, key) for key in select_cols]
 
     with engine.begin() as conn:
-        result = conn.execute(select(*columns))
-        records = list(result.mappings())
-
-        df = pd.DataFrame(records)
-        df['domestic_titles'] = compute_score(
-            df, DOMESTIC_CONVENTION_WEIGHTS)
-        df['international_titles'] = compute_score(
-            df, INTERNATIONAL_CONVENTION_WEIGHTS)
-
-        print(df)
-
-        df = normalize_columns(
-            df, ['domestic_titles', 'international_titles'])
-
-        for _, row in df.iterrows():
-            club_name = row['name']
-            domestic_titles = float(row['domestic_titles']) if not pd.isna(
-                row['domestic_titles']) else None
-            international_titles = float(row['international_titles']) if not pd.isna(
-                row['international_titles']) else None
-
-            # DB更新
-            query = text("""
-                UPDATE clubs
-                SET
-                    domestic_titles = :domestic_titles,
-                    international_titles = :international_titles
-                WHERE normalize_alnum(name) = normalize_alnum(:club_name)
-            """)
-            conn.execute(
-                query, {
-                    'domestic_titles': domestic_titles,
-                    'international_titles': international_titles,
-                    'club_name': club_name,
-                })
+        changes = TITLES.update(conn)
 
-    print(f'domestic_titles and international_titles updated.')
+    if changes:
+        print(format_changes(changes, TITLES.columns))
+    print(f'domestic_titles and international_titles updated. updated={len(changes)}')
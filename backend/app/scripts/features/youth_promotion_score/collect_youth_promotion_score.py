@@ -1,28 +1,31 @@
 # 今シーズンの西暦を指定して実行する
 # flak collect-youth 2025
 
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import os
-import time
 from flask import current_app
 from pathlib import Path
 from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from ....clubs.aliases import ClubResolver
+from ..common.fetcher import Fetcher
+from ..common.parsing import parse_target
+from ..common.season_history import SeasonHistory, rolling_window, unmatched_messages
 
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
+DATABASE_URL = os.getenv('DATABASE_URL')
 BASE_URL = os.getenv('J_LEAGUE_URL') + \
     '/special/transfer/{year}/j{division}'
+WINDOW_SEASONS = 5  # 集計対象シーズン数（今シーズンを含む）
+# シーズン毎に保存する列
+HISTORY_COLUMNS = ['club_name', 'club_identifier', 'top_promotion_count']
 
 
-def fetch_youth_promotion_count(division: int, year: int) -> pd.DataFrame:
-    """ Jリーグ公式の移籍情報からトップ昇格人数を取得する """
-    url = BASE_URL.format(year=year, division=division)
-    r = requests.get(url)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, 'html.parser')
+def parse_youth_promotion_count(html: str) -> pd.DataFrame:
+    """ Jリーグ公式の移籍情報ページからトップ昇格人数を抽出する """
+    soup = parse_target(html, 'article')
     # クラブ毎の移籍情報を抽出
     articles = soup.find_all('article')
     if not articles:
@@ -47,40 +50,53 @@ def fetch_youth_promotion_count(division: int, year: int) -> pd.DataFrame:
 
 
 def collect_youth_promotion_score(current_year):
-    # 今年+過去4シーズン分を取得
-    target_years = list(range(int(current_year), int(current_year) - 5, -1))
+    # 今年+過去4シーズン分を集計する
+    target_years = list(range(int(current_year), int(current_year) - WINDOW_SEASONS, -1))
     print(f'target_years: {target_years}')
-    all_years_data = []
-    for year in target_years:
-        # シーズン毎のJ1〜J3全クラブのトップ昇格人数を取得する
-        yearly_scores = []
-        for division in [1, 2, 3]:
-            df = fetch_youth_promotion_count(division, year)
-            if df.empty:
-                continue
-            yearly_scores.append(
-                df[['club_name', 'club_identifier', 'top_promotion_count']])
-            time.sleep(1)  # スクレイピングの間隔を空けるため1秒待つ
+    history = SeasonHistory('youth_promotion_score')
+    # シーズン毎のクラブ数は確定済みの順位表（collect-strength-longの集計結果）の行数を使う
+    standings = SeasonHistory('strength_long_term')
 
-        # 1シーズン毎のJ1〜J3全クラブのトップ昇格人数を1つのDataFrameにまとめall_years_dataに追加
-        all_years_data.append(pd.concat(yearly_scores, ignore_index=True))
+    # 確定済みのシーズンは保存済みの結果を使い、今シーズンと未保存のシーズンの移籍情報ページのみ取得する
+    targets = history.missing([1, 2, 3], target_years)
+    fetcher = Fetcher()
+    pages = fetcher.get_many([
+        BASE_URL.format(year=year, division=division) for year, division in targets])
+    for (year, division), html in zip(targets, pages):
+        df = parse_youth_promotion_count(html).reindex(columns=HISTORY_COLUMNS)
+        # 終了したシーズンは確定済みとして保存し、次回以降は取得しない
+        # （順位表が未取得でクラブ数が分からない場合や、行数がクラブ数と合わない場合は未確定のまま次回取得し直す）
+        expected = standings.final_rows(division, year)
+        final = year < int(current_year)
+        saved_final = history.save(division, year, df, final=final and expected is not None, expected=expected)
+        if final and not saved_final:
+            print(f'[{year}] J{division}: {len(df)} clubs (expected {expected}), saved as not final')
+    print(f'fetched: {targets}')
 
-    # 今年のトップ昇格人数のDF（all_years_dataの先頭）を基準に過去シーズンのDFをclub_nameでLEFT結合していく
-    # こうすることで、今シーズンJリーグに所属しているクラブのトップ昇格人数だけを抽出できる
-    current_df = all_years_data[0].copy()
-    for i, past_df in enumerate(all_years_data[1:], start=1):
-        # 集計対象期間中に正式名が変更されたクラブもあるので、結合にはクラブの識別子を使い重複するクラブ名のカラムは除く
-        current_df = current_df.merge(
-            past_df[['club_identifier', 'top_promotion_count']],
-            on='club_identifier', how='left', suffixes=('', f'_{i}')
-        )
+    # シーズン間の結合は従来通り収集元サイトのクラブ識別子で行う（集計対象期間中に正式名が変更されたクラブも識別子は変わらない）
+    all_years_data = history.load([1, 2, 3], target_years)
+    current_df, unmatched = rolling_window(
+        all_years_data, target_years, 'top_promotion_count', key='club_identifier')
+    for message in unmatched_messages(current_df, unmatched, target_years, 'top_promotion_count',
+                                      key='club_identifier'):
+        print(message)
+
+    # 更新スクリプトでの照合用に今シーズンのクラブだけをclubs.idに解決する（あいまい一致は使わない）
+    with create_engine(DATABASE_URL).connect() as conn:
+        resolver = ClubResolver.load(conn)
+    current_df['club_id'] = pd.array(resolver.resolve_all(
+        current_df['club_name'], current_df['club_identifier'], fuzzy=False), dtype='Int64')
+    unresolved = current_df.loc[current_df['club_id'].isna(), 'club_name']
+    if not unresolved.empty:
+        print(f'Unresolved clubs: {", ".join(unresolved)}')
+    # 結合に使ったキーの出力は不要なので削除
+    current_df = current_df.drop(columns=['club_identifier'])
 
     # 各クラブ毎に5シーズン分のトップ昇格人数を合計する
-    numeric_cols = current_df.select_dtypes(include='number')
+    numeric_cols = current_df.drop(
+        columns=['club_id']).select_dtypes(include='number')
     current_df['youth_promotion_score'] = numeric_cols.sum(axis=1).astype(int)
-    print(current_df)
-    # 結合に使ったクラブ識別子カラムの出力は不要なので削除
-    current_df = current_df.drop(columns=['club_identifier'])
+    # クラブIDは更新スクリプトでの照合に使うため出力に残す
 
     print('')
     print('current_df')
@@ -89,5 +105,6 @@ def collect_youth_promotion_score(current_year):
     out_path = Path(current_app.root_path) / 'scripts' / \
         'features' / 'data' / 'youth_promotion_score.csv'
     current_df.to_csv(out_path, index=False, encoding='utf-8-sig')
+    print(f'HTTP: {fetcher.report()}')
     print(f"Output {out_path}")
     print("Process finished.")
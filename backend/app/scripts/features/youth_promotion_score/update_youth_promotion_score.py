@@ -2,8 +2,9 @@ import pandas as pd
 import os
 from flask import current_app
 from pathlib import Path
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from ..common.bulk_writer import write_club_features, format_report
 
 # 環境変数の読み込み
 load_dotenv(dotenv_path=Path(current_app.root_path) / '.env')
@@ -19,24 +20,13 @@ def update_youth_promotion_score():
     # CSV読み込み
     df = pd.read_csv(path)
 
+    # 値が無いクラブは更新しない
+    df = df.dropna(subset=['youth_promotion_score'])
+    df['youth_promotion_score'] = df['youth_promotion_score'].astype(int)
+
     engine = create_engine(DATABASE_URL)
 
     with engine.begin() as conn:
-        for _, row in df.iterrows():
-            club_name = row['club_name']
-            youth_promotion_score = int(row['youth_promotion_score']) if not pd.isna(
-                row['youth_promotion_score']) else None
-
-            if youth_promotion_score is not None:
-                query = text("""
-                    UPDATE clubs
-                    SET youth_promotion_score = :youth_promotion_score
-                    WHERE normalize_alnum(name) = normalize_alnum(:club_name)
-                """)
-                conn.execute(
-                    query, {
-                        'youth_promotion_score': youth_promotion_score,
-                        'club_name': club_name,
-                    })
-
-    print(f'youth_promotion_score updated using.')
+        report = write_club_features(conn, df, ['youth_promotion_score'])
+
+    print(f'youth_promotion_score updated. {format_report(report)}')
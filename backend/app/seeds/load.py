@@ -2,111 +2,77 @@ import json
 from pathlib import Path
 from flask import current_app
 from ..extensions import db
-from ..models import Club, Question, Choice, QuestionChoiceWeight, Prefecture, Stadium
+from ..models import Club, ClubAlias, Question, Choice, QuestionChoiceWeight, Prefecture, Stadium
+from ..clubs.aliases import normalize_key
+from .upsert import upsert_seed
 
 
-def run_seed_clubs():
-    """ seed_clubs_*.jsonを読み込み、Clubのシードデータを投入する。
-        nameをユニークキーとしてupsertに対応可能。
+def run_seed_clubs(season=2025, dry_run=False):
+    """ seed_clubs_<season>.jsonを読み込み、Clubのシードデータを投入する。
+        nameをユニークキーとしてupsertに対応可能。値が変わったクラブだけを更新する。
     """
-    path = Path(current_app.root_path) / 'seeds' / 'seed_clubs_2025.json'
+    path = Path(current_app.root_path) / 'seeds' / f'seed_clubs_{season}.json'
     if not path.exists():
         raise FileNotFoundError(f'{path} not found')
 
     with open(path, 'r', encoding='utf-8') as f:
         payload = json.load(f)
 
+    rows = []
     for c in payload:
-        name = c.get('name', '').strip()
-        short_name = c.get('short_name', '').strip()
-        division = int(c.get('division', 0))
-        location = c.get('location', '').strip()
-        image_url = c.get('image_url', '').strip()
-        team_color = c.get('team_color', '').strip()
-        website_url = c.get('website_url', '').strip()
-        description = c.get('description', '').strip()
-        prefcture_id = int(c.get('prefecture_id', 1))
-        supporter_heat = c.get('supporter_heat', 0)
-        rivalry_intensity_preference = c.get(
-            'rivalry_intensity_preference', 0)
-        main_stadium_id = c.get('main_stadium_id', 1)
-        win_j1 = c.get('win_j1', 0)
-        win_j2 = c.get('win_j2', 0)
-        win_j3 = c.get('win_j3', 0)
-        win_emperor = c.get('win_emperor', 0)
-        win_levain = c.get('win_levain', 0)
-        win_acl = c.get('win_acl', 0)
-        win_acl2 = c.get('win_acl2', 0)
-
-        # nameをユニークキーとしてupsert
-        club = Club.query.filter_by(name=name).first()
-        if club is None:
-            db.session.add(
-                Club(name=name, short_name=short_name, division=division, location=location, image_url=image_url, team_color=team_color,
-                     website_url=website_url, description=description, prefecture_id=prefcture_id, supporter_heat=supporter_heat,
-                     rivalry_intensity_preference=rivalry_intensity_preference, main_stadium_id=main_stadium_id,
-                     win_j1=win_j1, win_j2=win_j2, win_j3=win_j3, win_emperor=win_emperor, win_levain=win_levain,
-                     win_acl=win_acl, win_acl2=win_acl2))
-        else:
-            club.short_name = short_name
-            club.division = division
-            club.location = location
-            club.image_url = image_url
-            club.team_color = team_color
-            club.website_url = website_url
-            club.description = description
-            club.prefecture_id = prefcture_id
-            club.supporter_heat = supporter_heat
-            club.rivalry_intensity_preference = rivalry_intensity_preference
-            club.main_stadium_id = main_stadium_id
-            club.win_j1 = win_j1
-            club.win_j2 = win_j2
-            club.win_j3 = win_j3
-            club.win_emperor = win_emperor
-            club.win_levain = win_levain
-            club.win_acl = win_acl
-            club.win_acl2 = win_acl2
-
-    db.session.commit()
-    print(f'Seed completed: clubs inserted')
-
-
-def run_seed_stadiums():
-    """ seed_stadiums_*.jsonを読み込み、Stadiumのシードデータを投入する。
-        nameは変更される場合があるため、idをユニークキーとしてupsertに対応可能。
+        rows.append({
+            'name': c.get('name', '').strip(),
+            'short_name': c.get('short_name', '').strip(),
+            'division': int(c.get('division', 0)),
+            'location': c.get('location', '').strip(),
+            'image_url': c.get('image_url', '').strip(),
+            'team_color': c.get('team_color', '').strip(),
+            'website_url': c.get('website_url', '').strip(),
+            'description': c.get('description', '').strip(),
+            'prefecture_id': int(c.get('prefecture_id', 1)),
+            'supporter_heat': c.get('supporter_heat', 0),
+            'rivalry_intensity_preference': c.get('rivalry_intensity_preference', 0),
+            'main_stadium_id': c.get('main_stadium_id', 1),
+            'win_j1': c.get('win_j1', 0),
+            'win_j2': c.get('win_j2', 0),
+            'win_j3': c.get('win_j3', 0),
+            'win_emperor': c.get('win_emperor', 0),
+            'win_levain': c.get('win_levain', 0),
+            'win_acl': c.get('win_acl', 0),
+            'win_acl2': c.get('win_acl2', 0),
+        })
+
+    # nameをユニークキーとしてupsert
+    upsert_seed(Club, rows, key=['name'], dry_run=dry_run)
+    print(f'Seed completed: clubs ({path.name}){" [dry run]" if dry_run else ""}')
+
+
+def run_seed_stadiums(season=2025, dry_run=False):
+    """ seed_stadiums_<season>.jsonを読み込み、Stadiumのシードデータを投入する。
+        nameは変更される場合があるため、idをユニークキーとしてupsertに対応可能。値が変わったスタジアムだけを更新する。
     """
-    path = Path(current_app.root_path) / 'seeds' / 'seed_stadiums_2025.json'
-    print(path)
+    path = Path(current_app.root_path) / 'seeds' / f'seed_stadiums_{season}.json'
     if not path.exists():
         raise FileNotFoundError(f'{path} not found')
 
     with open(path, 'r', encoding='utf-8') as f:
         payload = json.load(f)
 
+    rows = []
     for s in payload:
-        id = s.get('id', 0)
-        name = s.get('name', '').strip()
-        latitude = float(s.get('latitude', 0))
-        longitude = float(s.get('longitude', 0))
-        capacity = int(s.get('capacity', 0))
-        walking_time_required = s.get('walking_time_required', 0)
-        bus_time_required = s.get('bus_time_required', 0)
-
-        # idをユニークキーとしてupsert
-        stadium = Stadium.query.filter_by(id=id).first()
-        if stadium is None:
-            db.session.add(
-                Stadium(id=id, name=name, latitude=latitude, longitude=longitude, capacity=capacity, walking_time_required=walking_time_required, bus_time_required=bus_time_required))
-        else:
-            stadium.name = name
-            stadium.latitude = latitude
-            stadium.longitude = longitude
-            stadium.capacity = capacity
-            stadium.walking_time_required = walking_time_required
-            stadium.bus_time_required = bus_time_required
+        rows.append({
+            'id': s.get('id', 0),
+            'name': s.get('name', '').strip(),
+            'latitude': float(s.get('latitude', 0)),
+            'longitude': float(s.get('longitude', 0)),
+            'capacity': int(s.get('capacity', 0)),
+            'walking_time_required': s.get('walking_time_required', 0),
+            'bus_time_required': s.get('bus_time_required', 0),
+        })
 
-    db.session.commit()
-    print(f'Seed completed: stadiums inserted')
+    # idをユニークキーとしてupsert
+    upsert_seed(Stadium, rows, key=['id'], dry_run=dry_run)
+    print(f'Seed completed: stadiums ({path.name}){" [dry run]" if dry_run else ""}')
 
 
 def run_seed_questions():
@@ -144,9 +110,9 @@ def run_seed_questions():
     print(f'Seed completed: questions & choices inserted (replaced all)')
 
 
-def run_seed_weights():
+def run_seed_weights(dry_run=False):
     """seed_question_choice_weights.jsonを読み込み、質問・選択肢の組に対応する特徴量の重みのデータを投入する。
-        insertのみ対応。
+        (質問, 選択肢, 特徴量)をユニークキーとして差分のみ反映し、jsonに無い重みは削除する。
     """
     path = Path(current_app.root_path) / 'seeds' / \
         'seed_question_choice_weights.json'
@@ -156,31 +122,30 @@ def run_seed_weights():
     with open(path, 'r', encoding='utf-8') as f:
         payload = json.load(f)
 
-    # 既存データを全削除
-    QuestionChoiceWeight.query.delete()
-    db.session.commit()
+    # 質問・選択肢のIDはorderからまとめて引く
+    question_ids = {order: id for id, order in db.session.query(Question.id, Question.order)}
+    choice_ids = {(question_id, order): id for id, question_id, order
+                  in db.session.query(Choice.id, Choice.question_id, Choice.order)}
 
+    rows = []
     for item in payload:
-        question = Question.query.filter_by(
-            order=item['question_order']).first()
-        if not question:
+        question_id = question_ids.get(item['question_order'])
+        if not question_id:
             continue
-        choice = Choice.query.filter_by(
-            question_id=question.id, order=item['choice_order']).first()
-        if not choice:
+        choice_id = choice_ids.get((question_id, item['choice_order']))
+        if not choice_id:
             continue
         for w in item['weights']:
-            db.session.add(
-                QuestionChoiceWeight(
-                    question_id=question.id,
-                    choice_id=choice.id,
-                    feature_name=w.get('feature', '').strip(),
-                    weight=w.get('weight', 0.0)
-                )
-            )
+            rows.append({
+                'question_id': question_id,
+                'choice_id': choice_id,
+                'feature_name': w.get('feature', '').strip(),
+                'weight': w.get('weight', 0.0),
+            })
 
-    db.session.commit()
-    print(f'Seed completed: weight mappings (replaced all)')
+    upsert_seed(QuestionChoiceWeight, rows, key=['question_id', 'choice_id', 'feature_name'],
+                replace=True, dry_run=dry_run)
+    print(f'Seed completed: weight mappings{" [dry run]" if dry_run else ""}')
 
 
 def run_seed_prefectures():
@@ -201,6 +166,37 @@ def run_seed_prefectures():
     print(f'Seed completed: prefectures (replaced all)')
 
 
+def run_seed_club_aliases(dry_run=False):
+    """seed_club_aliases.jsonを読み込み、クラブの別表記（旧名称・表記ゆれ・外部サイトの識別子）を投入する。
+        正規化した別表記をユニークキーとしてupsertに対応可能。正式名・略称はclubsから直接照合するため登録不要。
+    """
+    path = Path(current_app.root_path) / 'seeds' / 'seed_club_aliases.json'
+    if not path.exists():
+        raise FileNotFoundError(f'{path} not found')
+
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+
+    club_ids = {name: id for id, name in db.session.query(Club.id, Club.name)}
+    rows = {}
+    for item in payload:
+        club_id = club_ids.get(item.get('club', '').strip())
+        if not club_id:
+            print(f'Skipped: club not found ({item.get("club")})')
+            continue
+        for a in item.get('aliases', []):
+            alias = a.get('alias', '').strip()
+            normalized = normalize_key(alias)
+            if not normalized:
+                continue
+            # 正規化した別表記をユニークキーとしてupsert（json内で重複した場合は後の記載を優先）
+            rows[normalized] = {'normalized': normalized, 'club_id': club_id,
+                                'alias': alias, 'source': a.get('source')}
+
+    upsert_seed(ClubAlias, list(rows.values()), key=['normalized'], dry_run=dry_run)
+    print(f'Seed completed: club aliases{" [dry run]" if dry_run else ""}')
+
+
 def migrate_stadiums():
     """Clubデータからスタジアム関係のカラムを抽出しStadiumテーブルに移行する。
     """
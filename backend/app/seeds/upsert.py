@@ -0,0 +1,169 @@
+from sqlalchemy import and_, bindparam, select
+from sqlalchemy.dialects import postgresql, sqlite
+from ..extensions import db
+
+# 1回のINSERT文で投入する行数
+BATCH_SIZE = 500
+
+
+class SeedDiff:
+    """ シードデータと既存データの差分
+        inserts: 追加する行
+        updates: 値が変わった行と変更内容（キー, 行, {カラム: (変更前, 変更後)}）
+        unchanged: 変更の無い行数
+        deletes: 削除する行のキー（replace=Trueの場合のみ）
+    """
+
+    def __init__(self, table, key):
+        self.table = table
+        self.key = key
+        self.inserts = []
+        self.updates = []
+        self.unchanged = 0
+        self.deletes = []
+
+    @property
+    def changed(self):
+        return bool(self.inserts or self.updates or self.deletes)
+
+    def format(self, verbose=False):
+        """ 件数の要約（verbose=Trueの場合は行毎の差分も）を表示用の文字列で返す
+        """
+        lines = [f'{self.table.name}: {len(self.inserts)} inserted, {len(self.updates)} updated, '
+                 f'{len(self.deletes)} deleted, {self.unchanged} unchanged']
+        if verbose:
+            for row in self.inserts:
+                lines.append(f'  + {_format_key(self.key, row)}')
+            for key, _, changes in self.updates:
+                detail = ', '.join(f'{column}: {old!r} -> {new!r}'
+                                   for column, (old, new) in changes.items())
+                lines.append(f'  ~ {_format_key(self.key, key)} ({detail})')
+            for key in self.deletes:
+                lines.append(f'  - {_format_key(self.key, key)}')
+        return '\n'.join(lines)
+
+
+def diff_rows(model, rows, key, replace=False):
+    """ シードデータの行（カラム名→値の辞書）と既存データを比較する
+        既存データはシードデータに含まれるカラムだけを1回のSELECTで読み込む
+        replace=Trueの場合はシードデータに無い既存行を削除対象とする
+    """
+    table = model.__table__
+    key = tuple(key)
+    columns = list(dict.fromkeys(key + tuple(c for row in rows for c in row)))
+    existing = {}
+    for record in db.session.execute(select(*(table.c[c] for c in columns))).mappings():
+        existing[tuple(record[k] for k in key)] = record
+
+    diff = SeedDiff(table, key)
+    seen = set()
+    for row in rows:
+        row_key = tuple(row[k] for k in key)
+        if row_key in seen:
+            raise ValueError(f'duplicate {table.name} key in seed data: {row_key}')
+        seen.add(row_key)
+        current = existing.get(row_key)
+        if current is None:
+            diff.inserts.append(row)
+            continue
+        changes = {c: (current[c], v) for c, v in row.items()
+                   if c not in key and not _same(current[c], v)}
+        if changes:
+            diff.updates.append((row_key, row, changes))
+        else:
+            diff.unchanged += 1
+    if replace:
+        diff.deletes = [k for k in existing if k not in seen]
+    return diff
+
+
+def apply_diff(diff, batch_size=BATCH_SIZE):
+    """ 差分のうち追加・変更のある行だけをINSERT ... ON CONFLICT DO UPDATEでまとめて書き込む
+        （ON CONFLICTの無いDBではINSERTとUPDATEに分けて書き込む。コミットは呼び出し側で行う）。実行した文の数を返す
+    """
+    table, key = diff.table, diff.key
+    rows = diff.inserts + [row for _, row, _ in diff.updates]
+    statements = 0
+    if diff.deletes:
+        # 削除は複合キーに対応するため1行ずつのDELETEをexecutemanyで実行する
+        condition = and_(*(table.c[k] == bindparam(f'key_{k}') for k in key))
+        db.session.execute(table.delete().where(condition),
+                           [{f'key_{k}': v for k, v in zip(key, row_key)} for row_key in diff.deletes])
+        statements += 1
+    insert = _dialect_insert()
+    if insert is None:
+        return statements + _apply_without_upsert(diff, batch_size)
+    # 同じINSERT文に含める行はカラムを揃える必要があるため、カラムの組み合わせ毎に分ける
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row), []).append(row)
+    for columns, group in groups.items():
+        for i in range(0, len(group), batch_size):
+            stmt = insert(table).values(group[i:i + batch_size])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key),
+                set_={c: stmt.excluded[c] for c in columns if c not in key})
+            db.session.execute(stmt)
+            statements += 1
+    return statements
+
+
+def _apply_without_upsert(diff, batch_size):
+    """ ON CONFLICTの無いDBでは、差分の追加行をINSERT、変更行をキー指定のUPDATEでそれぞれexecutemanyする
+        （差分は同じトランザクション内で読み込んだ既存データとの比較なので、追加・変更の振り分けはそのまま使える）
+    """
+    table, key = diff.table, diff.key
+    statements = 0
+    groups = {}
+    for row in diff.inserts:
+        groups.setdefault(tuple(row), []).append(row)
+    for group in groups.values():
+        for i in range(0, len(group), batch_size):
+            db.session.execute(table.insert(), group[i:i + batch_size])
+            statements += 1
+    # 変更のあるカラムの組み合わせ毎に1つのUPDATE文にまとめる
+    groups = {}
+    for row_key, row, changes in diff.updates:
+        groups.setdefault(tuple(changes), []).append(
+            dict({f'key_{k}': v for k, v in zip(key, row_key)}, **{f'new_{c}': row[c] for c in changes}))
+    condition = and_(*(table.c[k] == bindparam(f'key_{k}') for k in key))
+    for columns, params in groups.items():
+        stmt = table.update().where(condition).values({c: bindparam(f'new_{c}') for c in columns})
+        db.session.execute(stmt, params)
+        statements += 1
+    return statements
+
+
+def upsert_seed(model, rows, key, replace=False, dry_run=False):
+    """ シードデータを差分だけ書き込み、差分を表示して返す（dry_run=Trueの場合は書き込まずに表示のみ）
+    """
+    diff = diff_rows(model, rows, key, replace=replace)
+    if dry_run:
+        print(diff.format(verbose=True))
+        return diff
+    statements = apply_diff(diff)
+    db.session.commit()
+    print(f'{diff.format(verbose=True)}\n({statements} statements)')
+    return diff
+
+
+def _dialect_insert():
+    # ON CONFLICTはPostgreSQL（本番）とSQLite（ローカル確認用）のINSERTで使える（それ以外のDBはNone）
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert
+    if db.engine.dialect.name == 'sqlite':
+        return sqlite.insert
+    return None
+
+
+def _same(old, new):
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)) \
+            and not isinstance(old, bool) and not isinstance(new, bool):
+        return float(old) == float(new)
+    return old == new
+
+
+def _format_key(key, value):
+    if isinstance(value, dict):
+        value = tuple(value[k] for k in key)
+    return value[0] if len(value) == 1 else value
@@ -0,0 +1,95 @@
+""" 適応的な質問順序のシミュレーション
+    合成データ上のランダムな回答者について、上位k件が確定するまでに回答した質問数を
+    固定順（question_id順に回答し、確定した時点で打ち切り）と適応順（QuestionPlannerが選んだ順）で比較する
+    確定の判定は厳密なため、打ち切った時点の上位k件は全問回答した場合と一致する（agreementで確認）
+    結果は1シナリオ1行のJSONで標準出力（--output指定時はファイル）に出力する
+
+    backendディレクトリで実行する:
+        python -m benchmarks.bench_adaptive --clubs 60 --questions 16 --users 200
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clubs', type=int, nargs='+', default=[60])
+    parser.add_argument('--questions', type=int, nargs='+', default=[16])
+    parser.add_argument('--features', type=int, default=14)
+    parser.add_argument('--users', type=int, default=200, help='シナリオ毎の回答者数')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--division', type=int, help='絞り込むディビジョン（省略時は全クラブ）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='結果を書き出すJSON Linesファイル')
+    return parser.parse_args(argv)
+
+
+def simulate(state, answers, k, division, adaptive):
+    """ 1人の回答者について、上位k件が確定するまで質問し、(回答した質問数, 上位k件, 計画にかかった秒数)を返す
+    """
+    from app.recommend.session import ScoreSession
+
+    planner = state.planner
+    truth = {answer['questionId']: answer['choiceId'] for answer in answers}
+    session = ScoreSession.start(state)
+    planning = 0.0
+    while True:
+        t = time.perf_counter()
+        remaining = planner.remaining(session.answers)
+        settled = planner.is_settled(session.raw, remaining, k, division)
+        question_id = None
+        if not settled:
+            question_id = planner.next_question(session.raw, remaining, k, division) \
+                if adaptive else remaining[0]
+        planning += time.perf_counter() - t
+        if question_id is None:
+            break
+        session.apply(state, question_id, truth[question_id])
+    return len(session.answers), set(state.top_k(session.raw, k, division).tolist()), planning
+
+
+def run_scenario(n_clubs, n_questions, args):
+    from app.recommend.serving import ServingState
+    from .synthetic import build_core, random_answer_sets
+
+    feature_store, weight_index = build_core(n_clubs, n_questions, args.features, args.seed)
+    state = ServingState(feature_store, weight_index)
+    answer_sets = random_answer_sets(n_questions, args.users, args.seed)
+
+    record = {'clubs': n_clubs, 'questions': n_questions, 'features': args.features,
+              'users': args.users, 'k': args.k, 'division': args.division}
+    for mode in ('static', 'adaptive'):
+        asked, agreement, planning = [], 0, 0.0
+        for answers in answer_sets:
+            n_asked, top, seconds = simulate(state, answers, args.k, args.division, mode == 'adaptive')
+            full = set(state.top_k(state.raw_scores(answers), args.k, args.division).tolist())
+            asked.append(n_asked)
+            agreement += top == full
+            planning += seconds
+        record[f'{mode}_mean_asked'] = round(float(np.mean(asked)), 3)
+        record[f'{mode}_p95_asked'] = float(np.percentile(asked, 95))
+        record[f'{mode}_agreement'] = agreement / len(answer_sets)
+        record[f'{mode}_planning_ms_per_question'] = round(
+            planning * 1000 / max(1, sum(asked) + len(asked)), 4)
+    return record
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for n_clubs in args.clubs:
+            for n_questions in args.questions:
+                out.write(json.dumps(run_scenario(n_clubs, n_questions, args)) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+""" 収集スクリプトのHTML解析のベンチマーク
+    記録済みのページ（収集スクリプトの応答キャッシュ、またはHTMLファイル）に対して
+    ページ全体の解析（html.parser / lxml）と対象要素のみの解析（parse_target）の
+    1ページあたりの解析時間・ピークメモリを計測し、取り出した要素の内容が一致するか確認する
+    結果は対象要素毎に1行のJSONで標準出力（--output指定時はファイル）に出力する
+
+    backendディレクトリで実行する:
+        python -m benchmarks.bench_parse --cache-dir app/scripts/features/cache
+        python -m benchmarks.bench_parse --html page1.html page2.html
+        python -m benchmarks.bench_parse --synthetic 20   # 記録済みページが無い環境向けの合成ページ
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from bs4 import BeautifulSoup
+from app.scripts.features.common.parsing import TARGETS, PARSER, parse_target
+
+MODES = ('full_html_parser', 'full_lxml', 'targeted')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cache-dir', help='収集スクリプトの応答キャッシュのディレクトリ')
+    parser.add_argument('--html', nargs='*', default=[], help='HTMLファイル')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='対象要素毎に作成する合成ページ数')
+    parser.add_argument('--repeat', type=int, default=5, help='1ページあたりの計測回数')
+    parser.add_argument('--output', help='結果を書き出すJSON Linesファイル')
+    return parser.parse_args(argv)
+
+
+def load_pages(args):
+    pages = []
+    if args.cache_dir:
+        base = Path(args.cache_dir)
+        for entry_path in sorted((base / 'entries').glob('*.json')):
+            entry = json.loads(entry_path.read_text(encoding='utf-8'))
+            blob = base / 'blobs' / entry['blob'][:2] / entry['blob']
+            if blob.exists():
+                pages.append(blob.read_bytes().decode(
+                    entry['encoding'], errors='replace'))
+    for path in args.html:
+        pages.append(Path(path).read_text(encoding='utf-8', errors='replace'))
+    for target in TARGETS:
+        pages.extend(synthetic_page(target, i) for i in range(args.synthetic))
+    return pages
+
+
+def synthetic_page(target, seed):
+    """ ヘッダー・ナビゲーション・スクリプト等に囲まれた対象要素を1つ含むページを作成する
+    """
+    rng = np.random.default_rng(seed)
+    name, attrs = TARGETS[target]
+    attr_text = ''.join(f' {k}="{v}"' for k, v in attrs.items())
+    rows = ''.join(
+        f'<tr><td>{i + 1}</td><td><span class="dsktp">club-{i}</span><span class="sp">c{i}</span></td>'
+        f'<td>{rng.integers(0, 100)}</td></tr>' for i in range(20))
+    if name == 'ul':
+        body = ''.join(f'<li><p class="team">club-{i}</p><div class="ranking_stats"><p>{rng.random():.3f}</p></div></li>'
+                       for i in range(20))
+    elif name == 'article':
+        body = f'<h3>club-{seed}</h3><span class="embM e{seed}"></span><table class="transferTable">{rows}</table>'
+    else:
+        body = rows
+    noise = ''.join(
+        f'<div class="news"><a href="/news/{i}">news {i}</a><p>{"lorem ipsum " * 20}</p></div>' for i in range(300))
+    scripts = '<script>var x = 1;</script>' * 50
+    return (f'<html><head><title>t</title>{scripts}</head><body><nav>{noise}</nav>'
+            f'<{name}{attr_text}>{body}</{name}><footer>{noise}</footer></body></html>')
+
+
+def find_targets(soup, target):
+    name, attrs = TARGETS[target]
+    return soup.find_all(name, attrs=attrs)
+
+
+def extract(html, mode, target):
+    if mode == 'targeted':
+        soup = parse_target(html, target)
+    else:
+        soup = BeautifulSoup(
+            html, 'html.parser' if mode == 'full_html_parser' else 'lxml')
+    return find_targets(soup, target)
+
+
+def measure(html, mode, target, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract(html, mode, target)
+        latencies.append(time.perf_counter() - started)
+    tracemalloc.start()
+    extract(html, mode, target)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, peak
+
+
+def fingerprint(elements):
+    return [' '.join(e.get_text(' ', strip=True).split()) for e in elements]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pages = load_pages(args)
+    if not pages:
+        sys.exit('no pages: specify --cache-dir, --html or --synthetic')
+    modes = MODES if PARSER == 'lxml' else ('full_html_parser', 'targeted')
+
+    # ページ全体を解析して、各ページに含まれる対象要素を判定する（計測対象外）
+    by_target = {target: [] for target in TARGETS}
+    for html in pages:
+        soup = BeautifulSoup(html, 'html.parser')
+        for target in TARGETS:
+            if find_targets(soup, target):
+                by_target[target].append(html)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for target, target_pages in by_target.items():
+            if not target_pages:
+                continue
+            record = {'target': target, 'pages': len(target_pages),
+                      'bytes': sum(len(h.encode('utf-8')) for h in target_pages)}
+            mismatches = 0
+            for mode in modes:
+                latencies, peaks = [], []
+                for html in target_pages:
+                    page_latencies, peak = measure(html, mode, target, args.repeat)
+                    latencies.extend(page_latencies)
+                    peaks.append(peak)
+                values = np.asarray(latencies) * 1000
+                record[f'{mode}_p50_ms'] = round(float(np.percentile(values, 50)), 4)
+                record[f'{mode}_p95_ms'] = round(float(np.percentile(values, 95)), 4)
+                record[f'{mode}_peak_bytes'] = int(max(peaks))
+            for html in target_pages:
+                if fingerprint(extract(html, 'full_html_parser', target)) != \
+                        fingerprint(extract(html, 'targeted', target)):
+                    mismatches += 1
+            record['mismatches'] = mismatches
+            record['speedup_p50'] = round(
+                record['full_html_parser_p50_ms'] / record['targeted_p50_ms'], 2)
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+""" 推薦処理のベンチマーク
+    合成データを指定の規模で作成し、Flaskのテストクライアント経由（client）と
+    スコア計算コアの直接呼び出し（core）のレイテンシ・スループット・ピークメモリを計測する
+    結果は1シナリオ1行のJSONで標準出力（--output指定時はファイル）に出力する
+
+    backendディレクトリで実行する:
+        python -m benchmarks.bench_recommend --clubs 60 1000 100000 --questions 10 200 --features 14 200
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('client', 'core', 'both'), default='both')
+    parser.add_argument('--clubs', type=int, nargs='+', default=[60, 1000, 100000])
+    parser.add_argument('--questions', type=int, nargs='+', default=[10, 200])
+    parser.add_argument('--features', type=int, nargs='+', default=[14, 200],
+                        help='coreモードの特徴量数（clientモードはClubのカラム数で固定）')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='シナリオ毎の計測リクエスト数')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--cache', action='store_true',
+                        help='推薦結果キャッシュを有効にして計測する（既定は無効）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='結果を書き出すJSON Linesファイル')
+    return parser.parse_args(argv)
+
+
+def summarize(latencies, elapsed):
+    """ レイテンシ（秒）のリストからp50/p95/p99（ミリ秒）とスループットを計算する
+    """
+    values = np.asarray(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(float(np.percentile(values, 50)), 4),
+        'p95_ms': round(float(np.percentile(values, 95)), 4),
+        'p99_ms': round(float(np.percentile(values, 99)), 4),
+        'mean_ms': round(float(values.mean()), 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def timed(fn, inputs, warmup):
+    for item in inputs[:warmup]:
+        fn(item)
+    latencies = []
+    started = time.perf_counter()
+    for item in inputs[warmup:]:
+        t = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - started
+
+
+def bench_core(n_clubs, n_questions, n_features, args):
+    """ FeatureStore / WeightIndex / ServingStateを直接呼び出してスコア計算コアを計測する
+    """
+    from app.recommend.feature_store import normalize_scores
+    from app.recommend.serving import ServingState
+    from app.recommend.session import ScoreSession, MAX_SESSION_ANSWERS
+    from .synthetic import build_core, random_answer_sets
+
+    tracemalloc.start()
+    t = time.perf_counter()
+    feature_store, weight_index = build_core(
+        n_clubs, n_questions, n_features, args.seed)
+    state = ServingState(feature_store, weight_index)
+    build_seconds = time.perf_counter() - t
+
+    answer_sets = random_answer_sets(
+        n_questions, args.requests + args.warmup, args.seed)
+
+    def run(answers):
+        scores = state.score(answers)
+        state.top_k(scores, args.k)
+
+    latencies, elapsed = timed(run, answer_sets, args.warmup)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # 同じ回答セットを/recommend/batch相当の行列積1回で処理した場合
+    t = time.perf_counter()
+    batch_scores = state.score_batch(answer_sets[args.warmup:])
+    for scores in batch_scores:
+        state.top_k(scores, args.k)
+    batch_seconds = time.perf_counter() - t
+
+    # /recommend/sessionのライブプレビュー相当
+    # （トークンから復元したセッションのスコアをキャッシュから取得し、1回答分の差分を反映して上位k件を抽出）
+    sessions = [ScoreSession.start(state)]
+    answer_stream = [answer for answers in answer_sets for answer in answers]
+
+    def run_delta(answer):
+        previous = sessions[-1]
+        session = ScoreSession(previous.generation, previous.answers, session_id=previous.session_id)
+        if len(session.answers) >= MAX_SESSION_ANSWERS:
+            session = ScoreSession.start(state)
+        session.rebase(state)
+        session.apply(state, answer['questionId'], answer['choiceId'])
+        state.top_k(normalize_scores(session.raw), args.k)
+        session.remember()
+        sessions[-1] = session
+
+    delta_latencies, _ = timed(run_delta, answer_stream[:args.requests + args.warmup], args.warmup)
+
+    return dict(summarize(latencies, elapsed), **{
+        'session_delta_p50_ms': round(float(np.percentile(np.asarray(delta_latencies) * 1000, 50)), 4),
+        'build_seconds': round(build_seconds, 4),
+        'batch_throughput_rps': round(len(batch_scores) / batch_seconds, 2) if batch_seconds > 0 else None,
+        'peak_traced_bytes': peak,
+    })
+
+
+def bench_client(n_clubs, n_questions, args):
+    """ 合成データをSQLiteに投入し、Flaskのテストクライアント経由で/recommendを計測する
+    """
+    from app import create_app
+    from app.recommend import serving
+    from app.recommend.cache import result_cache
+    from .synthetic import populate_db, random_answer_sets
+
+    app = create_app()
+    with app.app_context():
+        t = time.perf_counter()
+        populate_db(n_clubs, n_questions, args.seed)
+        populate_seconds = time.perf_counter() - t
+
+        serving.invalidate_serving_state()
+        t = time.perf_counter()
+        serving.get_serving_state()
+        warmup_seconds = time.perf_counter() - t
+
+    result_cache.clear()
+    result_cache.maxsize = 4096 if args.cache else 0
+
+    client = app.test_client()
+    answer_sets = random_answer_sets(
+        n_questions, args.requests + args.warmup, args.seed)
+
+    def run(answers):
+        response = client.post('/recommend/', json={'answers': answers, 'k': args.k})
+        assert response.status_code == 200, response.data
+
+    latencies, elapsed = timed(run, answer_sets, args.warmup)
+    return dict(summarize(latencies, elapsed), **{
+        'populate_seconds': round(populate_seconds, 4),
+        'state_build_seconds': round(warmup_seconds, 4),
+        'cache': result_cache.stats() if args.cache else None,
+    })
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='jclub-bench-')
+    # ベンチマーク用の使い捨てDB・世代番号ファイルを使う（変更監視スレッドは起動しない）
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['CHANGE_MARKER_DIR'] = workdir
+    os.environ['HOT_RELOAD'] = '0'
+    os.environ.pop('SERVING_SNAPSHOT_DIR', None)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for n_clubs in args.clubs:
+            for n_questions in args.questions:
+                if args.mode in ('core', 'both'):
+                    for n_features in args.features:
+                        result = bench_core(n_clubs, n_questions, n_features, args)
+                        emit(out, 'core', n_clubs, n_questions, n_features, result)
+                if args.mode in ('client', 'both'):
+                    from app.recommend.feature_store import FEATURE_COLUMNS
+                    result = bench_client(n_clubs, n_questions, args)
+                    emit(out, 'client', n_clubs, n_questions, len(FEATURE_COLUMNS), result)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def emit(out, mode, n_clubs, n_questions, n_features, result):
+    record = {
+        'mode': mode,
+        'clubs': n_clubs,
+        'questions': n_questions,
+        'features': n_features,
+        **result,
+        # プロセス全体のピークRSS（LinuxではKB単位）
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    out.write(json.dumps(record) + '\n')
+    out.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+""" 推薦処理のベンチマーク用の合成データ生成
+    DBに投入する場合はClub / Question / Choice / QuestionChoiceWeightを指定の規模で一括作成する
+    スコア計算コアのみを測る場合はFeatureStore / WeightIndexを配列から直接作成する
+"""
+import numpy as np
+from sqlalchemy import insert
+from app.extensions import db
+from app.models import Club, Stadium, Prefecture, Question, Choice, QuestionChoiceWeight
+from app.recommend.feature_store import FeatureStore, CLUB_FEATURE_COLUMNS, FEATURE_COLUMNS
+from app.recommend.weight_index import WeightIndex
+
+# 1質問あたりの選択肢数（seed_questions.jsonと同じ）
+CHOICES_PER_QUESTION = 3
+# 1選択肢あたりに重みを持たせる特徴量の数
+WEIGHTS_PER_CHOICE = 2
+# 一括INSERTの1回あたりの行数
+BATCH_SIZE = 5000
+
+
+def populate_db(n_clubs, n_questions, seed=0):
+    """ 合成データをDBに投入する（既存テーブルは作り直す）
+        DBに投入できる特徴量はClubのカラムに限られるため、特徴量数はFEATURE_COLUMNSで固定
+    """
+    rng = np.random.default_rng(seed)
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(insert(Prefecture), [{'id': 1, 'name': '東京都'}])
+    n_stadiums = max(1, n_clubs // 2)
+    _bulk_insert(Stadium, [{
+        'id': i + 1,
+        'name': f'stadium-{i + 1}',
+        'latitude': 35.0 + rng.random(),
+        'longitude': 139.0 + rng.random(),
+        'capacity': int(rng.integers(5000, 60000)),
+        'accessibility': float(rng.random()),
+    } for i in range(n_stadiums)])
+
+    _bulk_insert(Club, [dict({
+        'id': i + 1,
+        'name': f'club-{i + 1}',
+        'short_name': f'c{i + 1}',
+        'division': int(rng.integers(1, 4)),
+        'location': '東京都',
+        'prefecture_id': 1,
+        'main_stadium_id': int(rng.integers(1, n_stadiums + 1)),
+        'description': '',
+        'win_j1': 0, 'win_j2': 0, 'win_j3': 0, 'win_emperor': 0,
+        'win_levain': 0, 'win_acl': 0, 'win_acl2': 0,
+    }, **{name: float(rng.random()) for name in CLUB_FEATURE_COLUMNS if name != 'home_attendance'},
+        home_attendance=int(rng.integers(2000, 50000))) for i in range(n_clubs)])
+
+    _bulk_insert(Question, [{'id': q + 1, 'text': f'question-{q + 1}', 'order': q + 1}
+                            for q in range(n_questions)])
+    choices = []
+    weights = []
+    for q in range(n_questions):
+        for c in range(CHOICES_PER_QUESTION):
+            choice_id = q * CHOICES_PER_QUESTION + c + 1
+            choices.append({'id': choice_id, 'question_id': q + 1,
+                            'text': f'choice-{c + 1}', 'order': c + 1})
+            for feature in rng.choice(FEATURE_COLUMNS, WEIGHTS_PER_CHOICE, replace=False):
+                weights.append({'question_id': q + 1, 'choice_id': choice_id,
+                                'feature_name': str(feature), 'weight': float(rng.normal())})
+    _bulk_insert(Choice, choices)
+    _bulk_insert(QuestionChoiceWeight, weights)
+    db.session.commit()
+
+
+def _bulk_insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def build_core(n_clubs, n_questions, n_features, seed=0):
+    """ DBを介さずにスコア計算コア用のFeatureStore / WeightIndexを作成する
+    """
+    rng = np.random.default_rng(seed)
+    feature_names = [f'feature_{i}' for i in range(n_features)]
+    feature_store = FeatureStore(
+        np.arange(1, n_clubs + 1), feature_names,
+        rng.random((n_clubs, n_features)), rng.integers(1, 4, n_clubs))
+    weights = []
+    for q in range(n_questions):
+        for c in range(CHOICES_PER_QUESTION):
+            choice_id = q * CHOICES_PER_QUESTION + c + 1
+            for feature in rng.choice(feature_names, min(WEIGHTS_PER_CHOICE, n_features), replace=False):
+                weights.append((q + 1, choice_id, str(feature), float(rng.normal())))
+    weight_index = WeightIndex.compile(weights, feature_store.feature_index)
+    return feature_store, weight_index
+
+
+def random_answer_sets(n_questions, n_sets, seed=0):
+    """ 各質問にランダムな選択肢で回答した回答セットを作成する
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, CHOICES_PER_QUESTION, (n_sets, n_questions))
+    return [[{'questionId': q + 1, 'choiceId': q * CHOICES_PER_QUESTION + int(c) + 1}
+             for q, c in enumerate(row)] for row in picks]